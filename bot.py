@@ -1,20 +1,30 @@
 import discord
 from discord.ext import commands
 from dotenv import load_dotenv
-import json
 import os
-import requests
 import asyncio
-from flask import Flask, request, jsonify
-from threading import Thread
 import subprocess
-import time
-import aiohttp
-import aiofiles
-from functools import lru_cache
-from typing import Dict, Optional, Any
+from typing import Optional, Any
 import logging
 
+from core.coinflip import CoinflipEngine
+from core.deposits import PendingDeposits
+from core.history import HistoryStore
+from core.http import HttpClient
+from core.ledger import Ledger
+from core.money import to_micros, to_usd
+from core.names import NameResolver
+from core.notifications import DepositNotifier
+from core.outbound import NORMAL, Outbox
+from core.prices import PriceOracle
+from core.scheduler import Scheduler
+from core.sequence import SequenceAllocator
+from core.stats import StatsStore
+from core.storage import create_storage
+from core.webhook import CallbackServer
+from core.wallets import WalletRegistry
+from core.withdrawals import WithdrawalRegistry
+
 # -----------------------------------------
 # 1) Setup logging and load environment variables
 # -----------------------------------------
@@ -31,342 +41,194 @@ intents.members = True
 bot = commands.Bot(command_prefix="!", intents=intents)
 
 # -----------------------------------------
-# 2) Cache and optimization setup
+# 2) Storage and ledger setup
 # -----------------------------------------
-class DataCache:
-    def __init__(self):
-        self._wallets_cache = None
-        self._balances_cache = None
-        self._last_wallets_update = 0
-        self._last_balances_update = 0
-        self._cache_ttl = 30  # 30 seconds cache
-        
-    async def get_wallets(self) -> Dict:
-        """Get wallets with caching"""
-        current_time = time.time()
-        if (self._wallets_cache is None or 
-            current_time - self._last_wallets_update > self._cache_ttl):
-            try:
-                async with aiofiles.open("wallets.json", "r") as f:
-                    content = await f.read()
-                    self._wallets_cache = json.loads(content)
-                    self._last_wallets_update = current_time
-            except Exception as e:
-                logger.error(f"Error loading wallets: {e}")
-                return {}
-        return self._wallets_cache or {}
-    
-    async def get_balances(self) -> Dict:
-        """Get balances with caching"""
-        current_time = time.time()
-        if (self._balances_cache is None or 
-            current_time - self._last_balances_update > self._cache_ttl):
-            try:
-                async with aiofiles.open("balances.json", "r") as f:
-                    content = await f.read()
-                    self._balances_cache = json.loads(content)
-                    self._last_balances_update = current_time
-            except Exception as e:
-                logger.error(f"Error loading balances: {e}")
-                return {}
-        return self._balances_cache or {}
-    
-    async def update_balance(self, user_id: str, new_balance: float) -> None:
-        """Update balance in cache and file"""
-        if self._balances_cache is None:
-            await self.get_balances()
-        
-        self._balances_cache[user_id] = new_balance
-        try:
-            async with aiofiles.open("balances.json", "w") as f:
-                await f.write(json.dumps(self._balances_cache, indent=4))
-            self._last_balances_update = time.time()
-        except Exception as e:
-            logger.error(f"Error updating balances: {e}")
-
-# Global cache instance
-data_cache = DataCache()
-
-# Currency mappings (constants)
-CURRENCY_MAP = {
-    "btc": "bitcoin",
-    "ltc": "litecoin", 
-    "usdt@trx": "tether"
-}
+# Storage backend (STORAGE_BACKEND=sqlite|json), used by cogs through bot.storage
+storage = create_storage(os.getenv("STORAGE_BACKEND", "sqlite"))
+bot.storage = storage
 
-CRYPTO_CONVERSION_RATE = 100_000_000  # For satoshi-like conversions
+# Shared balance ledger, used by every cog through bot.ledger
+ledger = Ledger(storage)
+bot.ledger = ledger
+
+# Deposit wallets with the address -> owner index, used through bot.wallets
+wallets = WalletRegistry(storage)
+bot.wallets = wallets
+
+# Paged deposit / withdrawal history with cached per-user totals, used through bot.history
+history = HistoryStore(storage)
+bot.history = history
+
+# Withdrawal log with the pending tx hash / address index, used through bot.withdrawals
+withdrawals = WithdrawalRegistry(history)
+bot.withdrawals = withdrawals
+
+# Shared deadline scheduler (game resolution timers), used through bot.scheduler
+scheduler = Scheduler()
+bot.scheduler = scheduler
+
+# Prioritized, rate-limited queue for messages and edits outside interaction responses, used through bot.outbox
+outbox = Outbox()
+bot.outbox = outbox
+
+# Cached user display names for leaderboards and notifications, used through bot.names
+names = NameResolver(bot)
+bot.names = names
+
+# Incremental wager / deposit totals and top-k rankings, used through bot.stats
+stats = StatsStore(storage)
+bot.stats = stats
+
+# Coinflip game numbers, reserved from storage 1000 at a time
+game_numbers = SequenceAllocator(storage, "coinflip")
+
+# Coinflip games and their state machine, used by the coinflip cog through bot.coinflips
+coinflips = CoinflipEngine(ledger, storage, scheduler, game_numbers, stats)
+bot.coinflips = coinflips
 
 # -----------------------------------------
-# 3) Optimized price fetching with caching
+# 3) Shared HTTP client and price oracle
 # -----------------------------------------
-@lru_cache(maxsize=32)
-def get_cached_price(currency: str, cache_time: int) -> float:
-    """Cache prices for 60 seconds intervals"""
-    return _fetch_price_sync(currency)
-
-def _fetch_price_sync(currency: str) -> float:
-    """Synchronous price fetch for caching"""
-    crypto_name = CURRENCY_MAP.get(currency)
-    if not crypto_name:
-        logger.warning(f"Unknown currency: {currency}")
-        return 0.0
-        
-    try:
-        url = f"https://api.coingecko.com/api/v3/simple/price?ids={crypto_name}&vs_currencies=usd"
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            return response.json()[crypto_name]["usd"]
-    except Exception as e:
-        logger.error(f"Error fetching USD value for {currency}: {e}")
-    return 0.0
+# Pooled keep-alive client for all Apirone/CoinGecko/ngrok calls, used through bot.http_client
+http_client = HttpClient()
+bot.http_client = http_client
+
+# Batched, coalesced CoinGecko prices, used by cogs through bot.prices
+prices = PriceOracle(http_client)
+bot.prices = prices
+
+CRYPTO_CONVERSION_RATE = 100_000_000  # For satoshi-like conversions
 
 async def convert_to_usd(value: float, currency: str) -> float:
-    """Convert crypto value to USD with caching"""
-    # Use current minute as cache key for 60-second cache
-    cache_time = int(time.time() // 60)
-    usd_rate = get_cached_price(currency, cache_time)
+    """Convert crypto value to USD using the shared price oracle"""
+    usd_rate = await prices.get_price(currency)
+    if usd_rate is None:
+        raise ValueError(f"No USD price available for {currency}")
     return (value / CRYPTO_CONVERSION_RATE) * usd_rate
 
 # -----------------------------------------
-# 4) Flask tracking server setup
+# 4) Callback server setup
 # -----------------------------------------
-app = Flask(__name__)
 ngrok_url = None
 
-@app.route("/callback", methods=["POST"])
-def callback():
-    """Optimized callback handler"""
-    try:
-        data = request.json
-        if not data:
-            return jsonify({"error": "No data received"}), 400
-            
-        logger.info(f"Callback received: {data}")
-
-        # Extract necessary details from callback
-        tx_hash = data.get("input_transaction_hash")
-        confirmations = data.get("confirmations", 0)
-        input_address = data.get("input_address")
-        value = data.get("value")
-        currency = data.get("currency")
-
-        # Validate required fields
-        if not all([tx_hash, input_address, value, currency]):
-            logger.warning("Missing required fields in callback")
-            return jsonify({"error": "Missing required fields"}), 400
-
-        # Schedule async operations
-        asyncio.run_coroutine_threadsafe(
-            handle_callback_async(tx_hash, confirmations, input_address, value, currency),
-            bot.loop
-        )
-
-        return jsonify({"status": "success"}), 200
-        
-    except Exception as e:
-        logger.error(f"Error in callback: {e}")
-        return jsonify({"error": "Internal server error"}), 500
-
 async def handle_callback_async(tx_hash: str, confirmations: int, input_address: str, 
                                value: float, currency: str) -> None:
-    """Handle callback operations asynchronously"""
-    try:
-        # DM Handling: Notify only at 0 and 1 confirmation
-        if confirmations <= 1:
-            await notify_user_async(input_address, tx_hash, confirmations, value, currency)
+    """Handle callback operations asynchronously; errors propagate to the callback worker, which counts them"""
+    # Resolve the depositor once for both the DM and the balance update
+    owner = wallets.owner_of(input_address)
+    if owner:
+        user_id, _ = owner
 
-        # Handle balance update only when confirmations = 1
+        # Pending deposits only get a DM, queued without waiting on Discord
+        if confirmations == 0:
+            notifier.deposit_pending(user_id, tx_hash, value, currency)
+
+        # Handle balance update only when confirmations = 1; persisted until credited,
+        # and retried callbacks are no-ops
         if confirmations == 1:
-            await update_balance_async(input_address, value, currency, tx_hash)
+            key = deposit_key(currency, tx_hash, input_address)
+            await pending_deposits.submit(key, user_id, value, currency, tx_hash, input_address)
 
-        # Update the payment processing message with transaction hash (for withdrawals)
-        if tx_hash:
-            await update_payment_message_async(tx_hash, input_address, currency)
-            
-    except Exception as e:
-        logger.error(f"Error handling callback async: {e}")
+    # Update the payment processing message with transaction hash (for withdrawals)
+    if tx_hash:
+        await update_payment_message_async(tx_hash, input_address, currency)
 
 async def update_payment_message_async(tx_hash: str, input_address: str, currency: str) -> None:
     """Optimized payment message update"""
-    try:
-        async with aiofiles.open("withdrawals.json", "r") as f:
-            content = await f.read()
-            withdrawals = json.loads(content)
-
-        # Find the relevant withdrawal entry
-        for user_id, withdrawal_list in withdrawals.items():
-            for withdrawal in withdrawal_list:
-                if (withdrawal.get("input_address") == input_address and 
-                    withdrawal.get("currency") == currency):
-                    
-                    user_channel_id = withdrawal.get("channel_id")
-                    message_id = withdrawal.get("message_id")
-
-                    if user_channel_id and message_id:
-                        await update_embed_message(user_channel_id, message_id, tx_hash, currency)
-                    return
-                    
-    except Exception as e:
-        logger.error(f"Error updating payment message: {e}")
+    withdrawal = withdrawals.pop(tx_hash, input_address, currency)
+    if withdrawal:
+        await update_embed_message(withdrawal["channel_id"], withdrawal["message_id"], tx_hash, currency)
 
 async def update_embed_message(channel_id: int, message_id: int, tx_hash: str, currency: str) -> None:
     """Update embed message with transaction hash"""
-    try:
-        channel = bot.get_channel(channel_id)
-        if not channel:
-            logger.warning(f"Channel {channel_id} not found")
-            return
-
-        message = await channel.fetch_message(message_id)
-        if not message:
-            logger.warning(f"Message {message_id} not found")
-            return
-
-        embed = discord.Embed(
-            description=f"<:checkmarkkk:1290435916841877525> Your {currency.capitalize()} payment has been sent successfully. "
-                        f"Here's the [TXID](https://blockchair.com/{currency}/transaction/{tx_hash}).",
-            color=discord.Color.green()
-        )
-        await message.edit(embed=embed)
-        
-    except Exception as e:
-        logger.error(f"Error updating embed message: {e}")
-
-async def notify_user_async(input_address: str, tx_hash: str, confirmations: int, 
-                           value: float, currency: str) -> None:
-    """Optimized user notification"""
-    try:
-        wallets = await data_cache.get_wallets()
-        
-        for user_id, user_wallets in wallets.items():
-            for crypto_key, address in user_wallets.items():
-                if address == input_address:
-                    user = bot.get_user(int(user_id))
-                    if user:
-                        await send_dm(user, tx_hash, confirmations, value, currency)
-                    return
-                    
-    except Exception as e:
-        logger.error(f"Error notifying user: {e}")
+    channel = bot.get_channel(channel_id)
+    if not channel:
+        logger.warning(f"Channel {channel_id} not found")
+        return
 
-async def send_dm(user: discord.User, tx_hash: str, confirmations: int, 
-                  value: float, currency: str) -> None:
-    """Send DM with transaction info"""
+    embed = discord.Embed(
+        description=f"<:checkmarkkk:1290435916841877525> Your {currency.capitalize()} payment has been sent successfully. "
+                    f"Here's the [TXID](https://blockchair.com/{currency}/transaction/{tx_hash}).",
+        color=discord.Color.green()
+    )
+    # Queued; merged with any other edit of the message still waiting to go out
+    outbox.edit(channel.get_partial_message(message_id), NORMAL, embed=embed)
+
+def deposit_key(currency: str, tx_hash: str, input_address: str) -> str:
+    """Idempotency key of a deposit; one tx can pay several of our addresses"""
+    return f"deposit:{currency.lower()}:{tx_hash}:{input_address}"
+
+async def update_balance_async(user_id: str, value: float, currency: str, tx_hash: str, input_address: str) -> bool:
+    """Credit a confirmed deposit once; returns False if it was already credited.
+
+    Raises if there's no USD price yet or the ledger write fails, so
+    pending_deposits keeps the deposit and retries it.
+    """
+    if not tx_hash:
+        logger.error(f"Refusing to credit a deposit to {input_address} without a tx hash")
+        return False
+    key = deposit_key(currency, tx_hash, input_address)
+    if ledger.has_applied(key):
+        logger.info(f"Deposit {tx_hash} to {input_address} already credited, ignoring retry")
+        return False
+
+    value_usd = await convert_to_usd(value, currency)
+    # Re-checked atomically with the credit: a concurrent retry may have won the race
+    new_balance = await ledger.credit_once(key, user_id, to_micros(value_usd), reason=f"deposit {tx_hash}")
+    if new_balance is None:
+        logger.info(f"Deposit {tx_hash} to {input_address} already credited, ignoring retry")
+        return False
+
+    logger.info(f"User {user_id}'s new balance is ${to_usd(new_balance):.2f}")
+
+    # Record the deposit; the credit above is what must not be lost
     try:
-        blockchain_url = f"https://blockchair.com/{CURRENCY_MAP[currency]}/transaction/{tx_hash}"
-        value_usd = await convert_to_usd(value, currency)
-
-        if confirmations == 0:
-            embed = discord.Embed(
-                title="Pending Deposit",
-                description=f"We have detected a pending deposit from your {currency.upper()} address.",
-                color=discord.Color.orange()
-            )
-            embed.add_field(name="Amount", value=f"${value_usd:.2f}", inline=True)
-            embed.add_field(name="Blockchain", value=f"[Click Here]({blockchain_url})", inline=True)
-            embed.add_field(name="Confirmations", value="0/1", inline=True)
-            embed.set_footer(text="This transaction will be automatically credited once confirmed.")
-            
-        elif confirmations == 1:
-            embed = discord.Embed(
-                title="Transaction Confirmed",
-                description=f"Your {currency.upper()} deposit has been confirmed.",
-                color=discord.Color.green()
+        deposits_cog = bot.get_cog('DepositsCog')
+        if deposits_cog:
+            await deposits_cog.record_deposit(
+                user_id=str(user_id),
+                currency=currency,
+                amount=value_usd,
+                tx_hash=tx_hash
             )
-            embed.add_field(name="Amount", value=f"${value_usd:.2f}", inline=True)
-            embed.add_field(name="Blockchain", value=f"[Click Here]({blockchain_url})", inline=True)
-            embed.add_field(name="Confirmations", value="1/1", inline=True)
-
-        await user.send(embed=embed)
-        
     except Exception as e:
-        logger.error(f"Error sending DM to user {user.id}: {e}")
+        logger.error(f"Error recording deposit {tx_hash}: {e}")
 
-async def update_balance_async(input_address: str, value: float, currency: str, tx_hash: str) -> None:
-    """Optimized balance update"""
-    try:
-        wallets = await data_cache.get_wallets()
-        balances = await data_cache.get_balances()
-
-        for user_id, user_wallets in wallets.items():
-            for crypto_key, address in user_wallets.items():
-                if address == input_address:
-                    if user_id not in balances:
-                        balances[user_id] = 0.0
-
-                    value_usd = await convert_to_usd(value, currency)
-                    new_balance = balances[user_id] + value_usd
-
-                    # Update balance using cache
-                    await data_cache.update_balance(user_id, new_balance)
-
-                    logger.info(f"User {user_id}'s new balance is ${new_balance:.2f}")
-
-                    # Record the deposit
-                    deposits_cog = bot.get_cog('DepositsCog')
-                    if deposits_cog:
-                        deposits_cog.record_deposit(
-                            user_id=str(user_id),
-                            currency=currency,
-                            amount=value_usd,
-                            tx_hash=tx_hash
-                        )
-
-                    # Notify the deposit channel
-                    await notify_deposit_channel(user_id, value_usd, currency)
-                    return
-                    
-    except Exception as e:
-        logger.error(f"Error updating balance: {e}")
+    # DM the user and announce in the deposit channel, off the crediting path
+    notifier.deposit_confirmed(user_id, tx_hash, value_usd, currency)
+    return True
 
-async def notify_deposit_channel(user_id: str, value_usd: float, currency: str) -> None:
-    """Notify deposit channel with optimized user fetching"""
-    try:
-        deposit_channel_id = int(os.getenv("DEPOSIT_CHANNEL_ID"))
-        channel = bot.get_channel(deposit_channel_id)
-        if not channel:
-            logger.error(f"Deposit channel {deposit_channel_id} not found")
-            return
-
-        user = await bot.fetch_user(int(user_id))
-        user_name = user.name if user else "Unknown User"
-
-        embed = discord.Embed(
-            title="New Deposit Confirmed!",
-            description=f"A deposit has been confirmed for {user_name}.",
-            color=discord.Color.green()
-        )
-        embed.add_field(name="User", value=user_name, inline=True)
-        embed.add_field(name="Amount (USD)", value=f"${value_usd:.2f}", inline=True)
-        embed.add_field(name="Currency", value=currency.upper(), inline=True)
-        embed.set_footer(text="Deposit successfully credited.")
+# Confirmed deposits are persisted until credited and retried while the price or ledger is unavailable
+pending_deposits = PendingDeposits(storage, update_balance_async)
 
-        await channel.send(embed=embed)
-        
-    except Exception as e:
-        logger.error(f"Error notifying deposit channel: {e}")
+# Deposit DMs (rate-limited) and batched deposit-channel announcements
+notifier = DepositNotifier(bot, names, outbox, convert_to_usd, int(os.getenv("DEPOSIT_CHANNEL_ID", "0")) or None)
 
-def run_flask():
-    """Run Flask server with optimized settings"""
-    app.run(host="0.0.0.0", port=5000, threaded=True)
+# aiohttp webhook ingress on the bot's loop, feeding handle_callback_async through bounded
+# per-address queues drained by a fixed worker pool
+callback_server = CallbackServer(
+    handle_callback_async,
+    port=int(os.getenv("CALLBACK_PORT", "5000")),
+    workers=int(os.getenv("CALLBACK_WORKERS", "4"))
+)
 
 # -----------------------------------------
 # 5) Optimized ngrok setup
 # -----------------------------------------
-def run_ngrok():
-    """Start ngrok with better error handling"""
+async def start_ngrok():
+    """Start ngrok and discover its public URL without blocking the loop"""
     global ngrok_url
     logger.info("Starting ngrok...")
 
     try:
-        ngrok_process = subprocess.Popen(
-            ["ngrok", "http", "5000"], 
+        subprocess.Popen(
+            ["ngrok", "http", os.getenv("CALLBACK_PORT", "5000")], 
             stdout=subprocess.PIPE, 
             stderr=subprocess.PIPE
         )
-        time.sleep(3)  # Give ngrok more time to initialize
+        await asyncio.sleep(3)  # Give ngrok more time to initialize
 
-        response = requests.get("http://localhost:4040/api/tunnels", timeout=10)
+        response = await http_client.get("http://localhost:4040/api/tunnels", "ngrok.tunnels", timeout=10)
         tunnels = response.json().get("tunnels", [])
         
         if tunnels:
@@ -408,20 +270,43 @@ async def load_extensions():
 async def main():
     """Main function with improved error handling and startup sequence"""
     try:
-        # 1) Start Flask in a separate thread
-        flask_thread = Thread(target=run_flask, daemon=True)
-        flask_thread.start()
-        logger.info("Flask server started")
-
-        # 2) Start ngrok
-        ngrok_thread = Thread(target=run_ngrok, daemon=True)
-        ngrok_thread.start()
-        logger.info("ngrok thread started")
-
-        # 3) Start the Discord bot
+        # 1) Start the Discord bot and shared services
         async with bot:
-            await load_extensions()
-            await bot.start(os.getenv('DISCORD_TOKEN'))
+            await storage.open()
+            await ledger.start()
+            await wallets.load()
+            await stats.start()
+            await http_client.start()
+            await prices.start()
+            await scheduler.start()
+            await outbox.start()
+            try:
+                # 2) Start ngrok
+                ngrok_task = asyncio.create_task(start_ngrok())
+                logger.info("ngrok startup scheduled")
+
+                await load_extensions()
+
+                # Restore open coinflips once the cog that renders them is loaded
+                await coinflips.start()
+
+                # 3) Accept callbacks once the cogs they use are loaded
+                await notifier.start()
+                await pending_deposits.start()
+                await callback_server.start()
+                await bot.start(os.getenv('DISCORD_TOKEN'))
+            finally:
+                await callback_server.close()
+                await pending_deposits.close()
+                await notifier.close()
+                await outbox.close()
+                await coinflips.close()
+                await scheduler.close()
+                await prices.close()
+                await http_client.close()
+                await stats.close()
+                await ledger.close()
+                await storage.close()
             
     except Exception as e:
         logger.error(f"Error in main: {e}")
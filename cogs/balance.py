@@ -1,43 +1,15 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import json
-import aiofiles
 import logging
-from typing import Dict, Optional
+
+from core.money import to_usd
 
 logger = logging.getLogger(__name__)
 
 class BalanceCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self._balance_cache = {}
-        self._cache_expiry = {}
-        self._cache_ttl = 30  # 30 seconds cache
-
-    async def _get_balances(self) -> Dict[str, float]:
-        """Get balances with caching"""
-        import time
-        current_time = time.time()
-        
-        if (not self._balance_cache or 
-            current_time - self._cache_expiry.get('balances', 0) > self._cache_ttl):
-            try:
-                async with aiofiles.open("balances.json", "r") as f:
-                    content = await f.read()
-                    self._balance_cache = json.loads(content)
-                    self._cache_expiry['balances'] = current_time
-            except FileNotFoundError:
-                logger.warning("balances.json not found, creating empty balance data")
-                self._balance_cache = {}
-            except json.JSONDecodeError as e:
-                logger.error(f"Error decoding balances.json: {e}")
-                self._balance_cache = {}
-            except Exception as e:
-                logger.error(f"Unexpected error loading balances: {e}")
-                self._balance_cache = {}
-        
-        return self._balance_cache
 
     @app_commands.command(name="balance", description="Check your or another user's balance in USD")
     @app_commands.describe(user="The user whose balance you want to check")
@@ -50,11 +22,11 @@ class BalanceCog(commands.Cog):
             target_user = user if user else interaction.user
             user_id = str(target_user.id)
 
-            # Load the balance data using caching
-            balances = await self._get_balances()
+            # Read from the shared ledger
+            ledger = self.bot.ledger
 
             # If the user doesn't have a balance
-            if user_id not in balances:
+            if not ledger.has_account(user_id):
                 embed = discord.Embed(
                     title="No Balance Found",
                     description=f"{target_user.display_name} doesn't have any balance yet.",
@@ -63,12 +35,7 @@ class BalanceCog(commands.Cog):
                 await interaction.followup.send(embed=embed)
                 return
 
-            # Ensure the balance is a number, either integer or float
-            try:
-                total_usd = float(balances[user_id])
-            except (ValueError, TypeError):
-                logger.error(f"Invalid balance format for user {user_id}: {balances[user_id]}")
-                total_usd = 0.0
+            total_usd = to_usd(ledger.get_balance(user_id))
 
             # Create an embed to display the balance
             embed = discord.Embed(
@@ -1,78 +1,40 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import json
 import aiohttp
-import aiofiles
 import logging
-import time
-from typing import Dict, Optional
+from typing import Optional
 
 logger = logging.getLogger(__name__)
 
 class DepositCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self._wallets_cache = {}
-        self._cache_expiry = {}
-        self._cache_ttl = 30  # 30 seconds cache
         self._api_url = "https://apirone.com/api/v2/accounts/apr-6fdfe29aad0a408dca1607d12c5e63e2/addresses"
 
-    async def _get_wallets(self) -> Dict[str, Dict]:
-        """Get wallets with caching"""
-        current_time = time.time()
-        
-        if (not self._wallets_cache or 
-            current_time - self._cache_expiry.get('wallets', 0) > self._cache_ttl):
-            try:
-                async with aiofiles.open("wallets.json", "r") as f:
-                    content = await f.read()
-                    self._wallets_cache = json.loads(content)
-                    self._cache_expiry['wallets'] = current_time
-            except FileNotFoundError:
-                logger.info("wallets.json not found, creating empty wallets data")
-                self._wallets_cache = {}
-                await self._save_wallets()
-            except json.JSONDecodeError as e:
-                logger.error(f"Error decoding wallets.json: {e}")
-                self._wallets_cache = {}
-            except Exception as e:
-                logger.error(f"Unexpected error loading wallets: {e}")
-                self._wallets_cache = {}
-        
-        return self._wallets_cache
-
-    async def _save_wallets(self) -> None:
-        """Save wallets to file and update cache"""
-        try:
-            async with aiofiles.open("wallets.json", "w") as f:
-                await f.write(json.dumps(self._wallets_cache, indent=4))
-            self._cache_expiry['wallets'] = time.time()
-        except Exception as e:
-            logger.error(f"Error saving wallets: {e}")
-
     async def _generate_address(self, cryptocurrency: str) -> Optional[str]:
-        """Generate new wallet address using async HTTP request"""
+        """Generate new wallet address through the shared HTTP client"""
         try:
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30)) as session:
-                async with session.post(
-                    self._api_url, 
-                    json={"currency": cryptocurrency},
-                    headers={"Content-Type": "application/json"}
-                ) as response:
-                    
-                    if response.status == 200:
-                        data = await response.json()
-                        if "address" in data:
-                            logger.info(f"Generated new {cryptocurrency} address: {data['address'][:10]}...")
-                            return data["address"]
-                        else:
-                            logger.error(f"Address not found in API response for {cryptocurrency}")
-                            return None
-                    else:
-                        logger.error(f"API request failed for {cryptocurrency}: Status {response.status}")
-                        return None
-                        
+            response = await self.bot.http_client.post(
+                self._api_url,
+                "apirone.addresses",
+                retries=1,
+                json={"currency": cryptocurrency},
+                headers={"Content-Type": "application/json"}
+            )
+
+            if response.status == 200:
+                data = response.json()
+                if "address" in data:
+                    logger.info(f"Generated new {cryptocurrency} address: {data['address'][:10]}...")
+                    return data["address"]
+                else:
+                    logger.error(f"Address not found in API response for {cryptocurrency}")
+                    return None
+            else:
+                logger.error(f"API request failed for {cryptocurrency}: Status {response.status}")
+                return None
+
         except aiohttp.ClientError as e:
             logger.error(f"Network error generating {cryptocurrency} address: {e}")
             return None
@@ -101,15 +63,15 @@ class DepositCog(commands.Cog):
             await interaction.response.defer()
             user_id = str(interaction.user.id)
 
-            # Load wallets from cache
-            wallets = await self._get_wallets()
+            # Load the user's wallets
+            wallets = await self.bot.wallets.get_wallets(user_id)
 
             # Get currency display info
             currency_name, currency_symbol = self._get_currency_info(cryptocurrency)
 
             # Check if user already has a wallet for this cryptocurrency
-            if user_id in wallets and cryptocurrency in wallets[user_id]:
-                existing_address = wallets[user_id][cryptocurrency]
+            if cryptocurrency in wallets:
+                existing_address = wallets[cryptocurrency]
                 
                 embed = discord.Embed(
                     title=f"{currency_symbol} {currency_name} Deposit Address",
@@ -144,12 +106,8 @@ class DepositCog(commands.Cog):
             new_address = await self._generate_address(cryptocurrency)
             
             if new_address:
-                # Save the new address to cache and file
-                if user_id not in self._wallets_cache:
-                    self._wallets_cache[user_id] = {}
-                
-                self._wallets_cache[user_id][cryptocurrency] = new_address
-                await self._save_wallets()
+                # Save and index the new address
+                await self.bot.wallets.assign(user_id, cryptocurrency, new_address)
 
                 # Create success embed
                 embed = discord.Embed(
@@ -1,58 +1,83 @@
 import discord
+import asyncio
+import logging
 from discord.ext import commands
-import json
+
+from core.outbound import INTERACTIVE
+from core.stats import DEPOSITED, WAGERED
+
+logger = logging.getLogger(__name__)
 
 class Leaderboard(commands.Cog):
-    def __init__(self, bot):
+    def __init__(self, bot, refresh_interval: float = 60.0, debounce: float = 5.0):
         self.bot = bot
+        self.refresh_interval = refresh_interval  # Re-render at least this often for changed totals and names
+        self.debounce = debounce  # Coalesce bursts of ranking changes into one render
+        self.embed = None  # Pre-rendered leaderboard, sent as-is by the command
+        self.refresh_task = None
 
-    @commands.command(name="leaderboard", description="Show the leaderboard for most coin-flipped and most deposited.")
-    async def leaderboard(self, ctx):
-        """
-        Command to display two leaderboards: Most Money Coin Flipped and Most Deposited.
-        Usage: /leaderboard
-        """
-        try:
-            # Load the necessary JSON files
-            with open("balances.json", "r") as f:
-                balances = json.load(f)
+    async def cog_load(self):
+        self.refresh_task = asyncio.create_task(self.refresh_loop())
 
-            with open("gameNumber.json", "r") as f:
-                game_data = json.load(f)  # Tracks money gambled in coin flips
+    async def cog_unload(self):
+        if self.refresh_task:
+            self.refresh_task.cancel()
 
-            with open("deposits.json", "r") as f:
-                deposits = json.load(f)  # Tracks total deposits
+    async def render(self) -> discord.Embed:
+        """Build the leaderboard embed from the stats store's rankings"""
+        # Top 10 of each board, maintained incrementally by the stats store
+        coin_flipped_leaderboard = self.bot.stats.top(WAGERED, 10)
+        deposited_leaderboard = self.bot.stats.top(DEPOSITED, 10)
 
-            # Sort users by most money coin flipped
-            coin_flipped_leaderboard = sorted(game_data.items(), key=lambda x: x[1], reverse=True)
+        # Resolve every name on both boards in one batch
+        user_ids = [user_id for user_id, _ in coin_flipped_leaderboard + deposited_leaderboard]
+        names = await self.bot.names.resolve(user_ids)
 
-            # Sort users by most money deposited
-            deposited_leaderboard = sorted(deposits.items(), key=lambda x: x[1], reverse=True)
+        # Build the leaderboard strings
+        coin_flipped_str = ""
+        for i, (user_id, amount) in enumerate(coin_flipped_leaderboard, start=1):
+            coin_flipped_str += f"**{i}. {names[int(user_id)]}** - ${amount:.2f}\n"
 
-            # Build the leaderboard strings
-            coin_flipped_str = ""
-            for i, (user_id, amount) in enumerate(coin_flipped_leaderboard[:10], start=1):  # Top 10
-                user = await self.bot.fetch_user(int(user_id))
-                username = user.display_name if user else "Unknown User"
-                coin_flipped_str += f"**{i}. {username}** - ${amount:.2f}\n"
+        deposited_str = ""
+        for i, (user_id, amount) in enumerate(deposited_leaderboard, start=1):
+            deposited_str += f"**{i}. {names[int(user_id)]}** - ${amount:.2f}\n"
 
-            deposited_str = ""
-            for i, (user_id, amount) in enumerate(deposited_leaderboard[:10], start=1):  # Top 10
-                user = await self.bot.fetch_user(int(user_id))
-                username = user.display_name if user else "Unknown User"
-                deposited_str += f"**{i}. {username}** - ${amount:.2f}\n"
+        # Create an embed to display the leaderboards
+        embed = discord.Embed(
+            title="🏆 Leaderboard",
+            color=0x000000  # Black color
+        )
+        embed.add_field(name="💰 Most Money Coin Flipped", value=coin_flipped_str if coin_flipped_str else "No data available.", inline=False)
+        embed.add_field(name="📥 Most Deposited", value=deposited_str if deposited_str else "No data available.", inline=False)
+        embed.set_footer(text="Keep flipping and depositing to climb the leaderboard!")
+        return embed
 
-            # Create an embed to display the leaderboards
-            embed = discord.Embed(
-                title="🏆 Leaderboard",
-                color=0x000000  # Black color
-            )
-            embed.add_field(name="💰 Most Money Coin Flipped", value=coin_flipped_str if coin_flipped_str else "No data available.", inline=False)
-            embed.add_field(name="📥 Most Deposited", value=deposited_str if deposited_str else "No data available.", inline=False)
-            embed.set_footer(text="Keep flipping and depositing to climb the leaderboard!")
+    async def refresh_loop(self):
+        """Re-render periodically, and early when a ranking's membership changes"""
+        await self.bot.wait_until_ready()
+        top_changed = self.bot.stats.top_changed
+        while True:
+            top_changed.clear()
+            try:
+                self.embed = await self.render()
+            except Exception as e:
+                logger.error(f"Error rendering leaderboard: {e}")
+            try:
+                await asyncio.wait_for(top_changed.wait(), timeout=self.refresh_interval)
+                await asyncio.sleep(self.debounce)
+            except asyncio.TimeoutError:
+                pass
 
-            # Send the embed
-            await ctx.send(embed=embed)
+    @commands.command(name="leaderboard", description="Show the leaderboard for most coin-flipped and most deposited.")
+    async def leaderboard(self, ctx):
+        """
+        Command to display two leaderboards: Most Money Coin Flipped and Most Deposited.
+        Usage: /leaderboard
+        """
+        try:
+            # Send the pre-rendered embed; only render inline before the first refresh
+            embed = self.embed or await self.render()
+            await self.bot.outbox.send(ctx, INTERACTIVE, embed=embed)
 
         except Exception as e:
             # Handle any errors
@@ -61,4 +86,4 @@ class Leaderboard(commands.Cog):
 
 # Setup function to add the cog to the bot
 async def setup(bot):
-    await bot.add_cog(Leaderboard(bot))
\ No newline at end of file
+    await bot.add_cog(Leaderboard(bot))
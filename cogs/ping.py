@@ -54,6 +54,18 @@ class PingCog(commands.Cog):
                 inline=True
             )
             
+            # Outbound API latency from the shared HTTP client
+            http_metrics = self.bot.http_client.metrics()
+            if http_metrics:
+                embed.add_field(
+                    name="API Latency",
+                    value="\n".join(
+                        f"`{endpoint}` {stats['avg_ms']:.0f}ms avg ({stats['requests']} calls, {stats['errors']} errors)"
+                        for endpoint, stats in sorted(http_metrics.items())
+                    ),
+                    inline=False
+                )
+            
             embed.set_footer(text="Bot is operational and ready to serve!")
             embed.timestamp = discord.utils.utcnow()
 
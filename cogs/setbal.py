@@ -5,7 +5,9 @@ import json
 import aiofiles
 import logging
 import time
-from typing import Dict, Set
+from typing import Set
+
+from core.money import to_micros, to_usd
 
 logger = logging.getLogger(__name__)
 
@@ -19,42 +21,6 @@ WHITELIST: Set[int] = {
 class SetBalanceCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self._balance_cache = {}
-        self._cache_expiry = {}
-        self._cache_ttl = 30  # 30 seconds cache
-
-    async def _get_balances(self) -> Dict[str, float]:
-        """Get balances with caching"""
-        current_time = time.time()
-        
-        if (not self._balance_cache or 
-            current_time - self._cache_expiry.get('balances', 0) > self._cache_ttl):
-            try:
-                async with aiofiles.open("balances.json", "r") as f:
-                    content = await f.read()
-                    self._balance_cache = json.loads(content)
-                    self._cache_expiry['balances'] = current_time
-            except FileNotFoundError:
-                logger.warning("balances.json not found, creating empty balance data")
-                self._balance_cache = {}
-                await self._save_balances()
-            except json.JSONDecodeError as e:
-                logger.error(f"Error decoding balances.json: {e}")
-                self._balance_cache = {}
-            except Exception as e:
-                logger.error(f"Unexpected error loading balances: {e}")
-                self._balance_cache = {}
-        
-        return self._balance_cache
-
-    async def _save_balances(self) -> None:
-        """Save balances to file and update cache"""
-        try:
-            async with aiofiles.open("balances.json", "w") as f:
-                await f.write(json.dumps(self._balance_cache, indent=4))
-            self._cache_expiry['balances'] = time.time()
-        except Exception as e:
-            logger.error(f"Error saving balances: {e}")
 
     async def _log_balance_change(self, admin_user: discord.User, target_user: discord.Member, 
                                  old_balance: float, new_balance: float) -> None:
@@ -142,18 +108,10 @@ class SetBalanceCog(commands.Cog):
                 await interaction.followup.send(embed=embed, ephemeral=True)
                 return
 
-            # Load balances with caching
-            balances = await self._get_balances()
             user_id = str(member.id)
 
-            # Get old balance for audit logging
-            old_balance = float(balances.get(user_id, 0.0))
-
-            # Set the new balance
-            self._balance_cache[user_id] = float(amount)
-
-            # Save updated balances
-            await self._save_balances()
+            # Set the new balance, keeping the old one for audit logging
+            old_balance = to_usd(await self.bot.ledger.set_balance(user_id, to_micros(amount), reason=f"setbal by {interaction.user.id}"))
 
             # Log the change for audit purposes
             await self._log_balance_change(interaction.user, member, old_balance, amount)
@@ -2,42 +2,20 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 from discord.ui import Button, View
-import json
-import os
-import requests
 
-# Define the paths for wallet and ticket status files
-WALLET_FILE = "wallets.json"
-TICKET_STATUS_FILE = "ticket_status.json"
+from core.outbound import INTERACTIVE
 
 # Define constants for cryptocurrencies and API URL for address generation
 CRYPTOCURRENCIES = ["btc", "ltc", "usdt@trx"]
 API_URL = "https://apirone.com/api/v2/accounts/apr-6fdfe29aad0a408dca1607d12c5e63e2/addresses"
 
-# Ensure the necessary JSON files exist and are initialized
-for file in [WALLET_FILE, TICKET_STATUS_FILE]:
-    if not os.path.isfile(file):
-        with open(file, "w") as f:
-            json.dump({}, f)
-
-# Function to load data from a JSON file
-def load_json(file_path):
-    with open(file_path, "r") as f:
-        return json.load(f)
-
-# Function to save data to a JSON file
-def save_json(file_path, data):
-    with open(file_path, "w") as f:
-        json.dump(data, f, indent=4)
-
 # Function to generate a new wallet address for a specified cryptocurrency
-def generate_wallet(cryptocurrency):
+async def generate_wallet(http_client, cryptocurrency):
     try:
-        url = f"https://apirone.com/api/v2/accounts/apr-6fdfe29aad0a408dca1607d12c5e63e2/addresses"
-        response = requests.post(url, json={"currency": cryptocurrency})
+        response = await http_client.post(API_URL, "apirone.addresses", retries=1, json={"currency": cryptocurrency})
         
         # Handle cases where the response is not in JSON format or is empty
-        if response.status_code == 200 and response.content:
+        if response.status == 200 and response.body:
             address_data = response.json()
             if "address" in address_data:
                 return address_data["address"]
@@ -45,7 +23,7 @@ def generate_wallet(cryptocurrency):
                 print(f"Error: Address not found in response for {cryptocurrency}. Response: {address_data}")
                 return None
         else:
-            print(f"Error: Failed to generate {cryptocurrency} address. Status code: {response.status_code}, Response: {response.content}")
+            print(f"Error: Failed to generate {cryptocurrency} address. Status code: {response.status}, Response: {response.body}")
             return None
     except Exception as e:
         print(f"Exception occurred while generating {cryptocurrency} address: {str(e)}")
@@ -59,31 +37,22 @@ class CryptoButton(Button):
     async def callback(self, interaction: discord.Interaction):
         user_id = str(interaction.user.id)
 
-        # Load wallets from wallets.json
-        try:
-            with open(WALLET_FILE, "r") as f:
-                wallets = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            wallets = {}
+        # Load the user's wallets
+        wallet_registry = interaction.client.wallets
+        user_wallets = await wallet_registry.get_wallets(user_id)
 
         # Check and generate any missing wallet addresses
-        if user_id not in wallets:
-            wallets[user_id] = {}
-
         for crypto in CRYPTOCURRENCIES:
-            if crypto not in wallets[user_id]:
-                new_wallet = generate_wallet(crypto)
+            if crypto not in user_wallets:
+                new_wallet = await generate_wallet(interaction.client.http_client, crypto)
                 if new_wallet:
-                    wallets[user_id][crypto] = new_wallet
-
-        # Save the updated wallet data
-        with open(WALLET_FILE, "w") as f:
-            json.dump(wallets, f, indent=4)
+                    user_wallets[crypto] = new_wallet
+                    await wallet_registry.assign(user_id, crypto, new_wallet)
 
         # Prepare wallet details
-        btc_wallet = wallets[user_id].get('btc', 'Not Available')
-        ltc_wallet = wallets[user_id].get('ltc', 'Not Available')
-        usdt_wallet = wallets[user_id].get('usdt@trx', 'Not Available')
+        btc_wallet = user_wallets.get('btc', 'Not Available')
+        ltc_wallet = user_wallets.get('ltc', 'Not Available')
+        usdt_wallet = user_wallets.get('usdt@trx', 'Not Available')
 
         # Create the new embed structure
         crypto_embed = discord.Embed(
@@ -116,9 +85,9 @@ class BtcAddressButton(Button):
     async def callback(self, interaction: discord.Interaction):
         await interaction.response.defer()
         try:
-            # Load wallets from the JSON file
-            wallets = load_json(WALLET_FILE)
-            btc_wallet = wallets.get(self.user_id, {}).get('btc', 'Address not available')
+            # Load wallets
+            wallets = await interaction.client.wallets.get_wallets(self.user_id)
+            btc_wallet = wallets.get('btc', 'Address not available')
             await interaction.followup.send(content=f"{btc_wallet}", ephemeral=False)
         except Exception as e:
             await interaction.followup.send(f"Failed to get Bitcoin address: {str(e)}", ephemeral=True)
@@ -147,9 +116,9 @@ class LtcAddressButton(Button):
     async def callback(self, interaction: discord.Interaction):
         await interaction.response.defer()
         try:
-            # Load wallets from the JSON file
-            wallets = load_json(WALLET_FILE)
-            ltc_wallet = wallets.get(self.user_id, {}).get('ltc', 'Address not available')
+            # Load wallets
+            wallets = await interaction.client.wallets.get_wallets(self.user_id)
+            ltc_wallet = wallets.get('ltc', 'Address not available')
             await interaction.followup.send(content=f"{ltc_wallet}", ephemeral=False)
         except Exception as e:
             await interaction.followup.send(f"Failed to get Litecoin address: {str(e)}", ephemeral=True)
@@ -163,9 +132,9 @@ class TetherAddressButton(Button):
     async def callback(self, interaction: discord.Interaction):
         await interaction.response.defer()
         try:
-            # Load wallets from the JSON file
-            wallets = load_json(WALLET_FILE)
-            usdt_wallet = wallets.get(self.user_id, {}).get('usdt@trx', 'Address not available')
+            # Load wallets
+            wallets = await interaction.client.wallets.get_wallets(self.user_id)
+            usdt_wallet = wallets.get('usdt@trx', 'Address not available')
             await interaction.followup.send(content=f"{usdt_wallet}", ephemeral=False)
         except Exception as e:
             await interaction.followup.send(f"Failed to get Tether address: {str(e)}", ephemeral=True)
@@ -178,11 +147,9 @@ class TicketButton(Button):
         guild = interaction.guild
         member = interaction.user
 
-        # Load ticket status from the file
-        ticket_status = load_json(TICKET_STATUS_FILE)
-
         # Check if user has an existing ticket
-        existing_ticket_name = ticket_status.get(str(member.id))
+        storage = interaction.client.storage
+        existing_ticket_name = await storage.get_ticket(str(member.id))
         if existing_ticket_name:
             # Restore access to the existing ticket
             existing_ticket = discord.utils.get(guild.text_channels, name=existing_ticket_name)
@@ -206,8 +173,7 @@ class TicketButton(Button):
         })
 
         # Save the ticket status with the channel name
-        ticket_status[str(member.id)] = ticket_channel.name
-        save_json(TICKET_STATUS_FILE, ticket_status)
+        await storage.set_ticket(str(member.id), ticket_channel.name)
 
         # First embed: Welcome message
         welcome_embed = discord.Embed(
@@ -235,9 +201,10 @@ class TicketButton(Button):
         for button in buttons:
             view.add_item(button)
 
-        # Send the two separate embeds in the ticket channel
-        await ticket_channel.send(embed=welcome_embed)
-        await ticket_channel.send(embed=options_embed, view=view)
+        # Queue the two separate embeds for the ticket channel; they go out in order
+        outbox = interaction.client.outbox
+        outbox.send(ticket_channel, INTERACTIVE, embed=welcome_embed)
+        outbox.send(ticket_channel, INTERACTIVE, embed=options_embed, view=view)
 
         await interaction.response.send_message(f'Ticket created: {ticket_channel.mention}', ephemeral=True)
 
@@ -256,7 +223,7 @@ class CloseButton(Button):
             "Ticket closed. You can reopen it by clicking the 'Open Ticket' button again.",
             ephemeral=True
         )
-        await channel.send(f"{member.mention} has closed this ticket.", delete_after=5)
+        interaction.client.outbox.send(channel, INTERACTIVE, content=f"{member.mention} has closed this ticket.", delete_after=5)
 
 class Ticket(commands.Cog):
     def __init__(self, bot):
@@ -282,7 +249,7 @@ class Ticket(commands.Cog):
         view = View(timeout=None)  # Persistent view for ticket panel
         view.add_item(button)
 
-        await interaction.channel.send(embed=embed, view=view)
+        self.bot.outbox.send(interaction.channel, INTERACTIVE, embed=embed, view=view)
         await interaction.response.send_message("Ticket panel created.", ephemeral=True)
 
 async def setup(bot):
@@ -1,53 +1,15 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import json
-import aiofiles
 import logging
-from typing import Dict, Optional
+
+from core.money import to_micros, to_usd
 
 logger = logging.getLogger(__name__)
 
 class TipCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self._balance_cache = {}
-        self._cache_expiry = {}
-        self._cache_ttl = 30  # 30 seconds cache
-
-    async def _get_balances(self) -> Dict[str, float]:
-        """Get balances with caching"""
-        import time
-        current_time = time.time()
-        
-        if (not self._balance_cache or 
-            current_time - self._cache_expiry.get('balances', 0) > self._cache_ttl):
-            try:
-                async with aiofiles.open("balances.json", "r") as f:
-                    content = await f.read()
-                    self._balance_cache = json.loads(content)
-                    self._cache_expiry['balances'] = current_time
-            except FileNotFoundError:
-                logger.warning("balances.json not found, creating empty balance data")
-                self._balance_cache = {}
-                await self._save_balances()
-            except json.JSONDecodeError as e:
-                logger.error(f"Error decoding balances.json: {e}")
-                self._balance_cache = {}
-            except Exception as e:
-                logger.error(f"Unexpected error loading balances: {e}")
-                self._balance_cache = {}
-        
-        return self._balance_cache
-
-    async def _save_balances(self) -> None:
-        """Save balances to file and update cache"""
-        try:
-            async with aiofiles.open("balances.json", "w") as f:
-                await f.write(json.dumps(self._balance_cache, indent=4))
-            self._cache_expiry['balances'] = time.time()
-        except Exception as e:
-            logger.error(f"Error saving balances: {e}")
 
     def _validate_amount(self, amount: float) -> tuple[bool, str]:
         """Validate tip amount"""
@@ -108,25 +70,17 @@ class TipCog(commands.Cog):
                 await interaction.followup.send(embed=embed, ephemeral=True)
                 return
 
-            # Load balances with caching
-            balances = await self._get_balances()
+            ledger = self.bot.ledger
 
             # Get sender and recipient IDs
             sender_id = str(interaction.user.id)
             recipient_id = str(member.id)
 
-            # Initialize balances if they don't exist
-            if sender_id not in balances:
-                balances[sender_id] = 0.0
-            if recipient_id not in balances:
-                balances[recipient_id] = 0.0
-
-            # Convert to float for safety
-            sender_balance = float(balances[sender_id])
-            recipient_balance = float(balances[recipient_id])
+            # Move the funds in one atomic ledger transfer; None means the sender couldn't cover it
+            balances = await ledger.transfer(sender_id, recipient_id, to_micros(amount), reason=f"tip {sender_id} -> {recipient_id}")
 
-            # Check if sender has enough balance
-            if sender_balance < amount:
+            if balances is None:
+                sender_balance = to_usd(ledger.get_balance(sender_id))
                 embed = discord.Embed(
                     title="Insufficient Balance",
                     description=f"⚠️ You don't have enough balance to tip **${amount:.2f}**.\n"
@@ -137,16 +91,8 @@ class TipCog(commands.Cog):
                 await interaction.followup.send(embed=embed, ephemeral=True)
                 return
 
-            # Process the tip
-            new_sender_balance = sender_balance - amount
-            new_recipient_balance = recipient_balance + amount
-
-            # Update cache
-            self._balance_cache[sender_id] = new_sender_balance
-            self._balance_cache[recipient_id] = new_recipient_balance
-
-            # Save to file
-            await self._save_balances()
+            new_sender_balance = to_usd(balances[sender_id])
+            new_recipient_balance = to_usd(balances[recipient_id])
 
             # Create success embed
             embed = discord.Embed(
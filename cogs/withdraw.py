@@ -1,10 +1,12 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import json
+import asyncio
 import os
-import requests
-from datetime import datetime
+
+from core.money import to_micros
+from core.outbound import INTERACTIVE, NORMAL
+from core.payouts import PayoutPipeline, WithdrawalJob
 
 class WithdrawalView(discord.ui.View):
     def __init__(self, bot, user_id, currency, amount, address, channel_id):
@@ -28,7 +30,7 @@ class WithdrawalView(discord.ui.View):
             description=":hourglass_flowing_sand: Withdrawal is processing...",
             color=discord.Color.orange()
         )
-        message = await channel.send(embed=processing_embed)
+        message = await self.bot.outbox.send(channel, INTERACTIVE, embed=processing_embed)
 
         # Send admin embed to admin channel
         admin_channel_id = int(os.getenv("withdrawl"))
@@ -43,7 +45,7 @@ class WithdrawalView(discord.ui.View):
             admin_embed.add_field(name="Request ID", value=f"{message.id}", inline=True)
             admin_embed.set_footer(text="Admin confirmation required.")
             admin_view = AdminView(self.bot, self.user_id, self.currency, self.amount, self.address, message.id, channel.id)
-            await admin_channel.send(embed=admin_embed, view=admin_view)
+            self.bot.outbox.send(admin_channel, NORMAL, embed=admin_embed, view=admin_view)
 
     @discord.ui.button(label="Deny", style=discord.ButtonStyle.red)
     async def deny(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -52,12 +54,9 @@ class WithdrawalView(discord.ui.View):
         await interaction.response.edit_message(view=self)
 
         # Refund user and notify cancellation
-        with open("balances.json", "r") as f:
-            balances = json.load(f)
-        if str(self.user_id) in balances:
-            balances[str(self.user_id)] += self.amount
-        with open("balances.json", "w") as f:
-            json.dump(balances, f, indent=4)
+        ledger = self.bot.ledger
+        if ledger.has_account(self.user_id):
+            await ledger.credit(self.user_id, to_micros(self.amount), reason="withdrawal refund")
 
         embed = discord.Embed(
             description="Withdrawal request canceled. Your balance has been refunded.",
@@ -82,158 +81,19 @@ class AdminView(discord.ui.View):
             child.disabled = True
         await interaction.response.edit_message(view=self)
 
+        # Hand the payout to the withdrawal pipeline and return right away
+        job = WithdrawalJob(self.user_id, self.currency, self.amount, self.address,
+                            self.request_id, self.user_channel_id, interaction.channel_id)
         try:
-            account = os.getenv("account")
-            transfer_key = os.getenv("transfer_key")
-
-            # Fetch exchange rate and convert USD to crypto
-            def fetch_exchange_rate(currency):
-                crypto_map = {
-                    "btc": "bitcoin",
-                    "ltc": "litecoin",
-                    "eth": "ethereum",
-                    "usdt@trx": "tether"
-                }
-                crypto_name = crypto_map.get(currency)
-                if not crypto_name:
-                    return None
-                url = f"https://api.coingecko.com/api/v3/simple/price?ids={crypto_name}&vs_currencies=usd"
-                response = requests.get(url)
-                if response.status_code == 200:
-                    return response.json().get(crypto_name, {}).get("usd")
-                return None
-
-            exchange_rate = fetch_exchange_rate(self.currency)
-            if not exchange_rate:
-                await interaction.followup.send(
-                    f"Failed to fetch exchange rate for {self.currency.upper()}. Please try again later.",
-                    ephemeral=True
-                )
-                return
-
-            crypto_amount = self.amount / exchange_rate  # Amount in cryptocurrency
-
-            def convert_to_smallest_unit(amount, currency):
-                if currency in ["btc", "ltc"]:
-                    return int(amount * 100_000_000)  # 8 decimal places
-                elif currency == "eth":
-                    return int(amount * 10**18)  # 18 decimal places
-                elif currency == "usdt@trx":
-                    return int(amount * 10**6)  # 6 decimal places
-                return int(amount)
-
-            smallest_unit_amount = convert_to_smallest_unit(crypto_amount, self.currency)
-
-            # Fetch wallet balance
-            balance_url = f"https://apirone.com/api/v2/accounts/{account}/balance"
-            balance_response = requests.get(balance_url)
-            if balance_response.status_code != 200:
-                await interaction.followup.send(
-                    f"Failed to retrieve account balance. Status Code: {balance_response.status_code}, Response: {balance_response.text}",
-                    ephemeral=True
-                )
-                return
-
-            balance_data = balance_response.json()
-            available_balance = 0
-            for item in balance_data.get("balance", []):
-                if item["currency"] == self.currency:
-                    available_balance = item["available"]
-                    break
-
-            if available_balance < smallest_unit_amount:
-                available_in_standard_units = available_balance / 100_000_000  # Adjust for LTC
-                requested_in_standard_units = smallest_unit_amount / 100_000_000  # Adjust for LTC
-                await interaction.followup.send(
-                    f"Not enough funds. Available: {available_in_standard_units:.8f} {self.currency.upper()}, "
-                    f"Requested: {requested_in_standard_units:.8f} {self.currency.upper()}",
-                    ephemeral=True
-                )
-                return
-
-            # Prepare and send the withdrawal request
-            url = f"https://apirone.com/api/v2/accounts/{account}/transfer"
-            headers = {'Content-Type': 'application/json'}
-            payload = {
-                "currency": self.currency,
-                "transfer-key": transfer_key,
-                "destinations": [{"address": self.address, "amount": smallest_unit_amount}],
-                "fee": "normal",
-                "subtract-fee-from-amount": True
-            }
-
-            response = requests.post(url, headers=headers, json=payload)
-
-            if response.status_code == 200 and response.content:
-                response_data = response.json()
-                print(f"Response Data: {response_data}")
-
-                # Extract TXID directly from the response
-                tx_hash = "N/A"
-                if "txs" in response_data and isinstance(response_data["txs"], list) and len(response_data["txs"]) > 0:
-                    tx_hash = response_data["txs"][0]
-
-                # Log the withdrawal
-                log_withdrawal(self.user_id, self.amount, self.currency, tx_hash, int(datetime.now().timestamp()))
-
-                # Map currency codes to full blockchain names for the explorer
-                blockchain_names = {
-                    "btc": "bitcoin",
-                    "ltc": "litecoin",
-                    "eth": "ethereum",
-                    "usdt@trx": "tether"
-                }
-                blockchain_name = blockchain_names.get(self.currency, self.currency)
-
-                # Format the URL for the blockchain explorer
-                explorer_url = f"https://blockchair.com/{blockchain_name}/transaction/{tx_hash}?from=apirone"
-
-                # Update the user's embed with the real TXID and the explorer link
-                user_channel = self.bot.get_channel(self.user_channel_id)
-                if user_channel:
-                    message = await user_channel.fetch_message(self.request_id)
-                    confirm_embed = discord.Embed(
-                        description=f":white_check_mark: Withdrawal confirmed! Your {blockchain_name.capitalize()} payment of **${self.amount:.2f}** has been sent successfully.\n"
-                                    f"Transaction ID: [View Transaction]({explorer_url})",
-                        color=discord.Color.green()
-                    )
-                    await message.edit(embed=confirm_embed)
-                    # Notify the user with a mention
-                    await user_channel.send(f"<@{self.user_id}>, your withdrawal has been confirmed!")
-
-            else:
-                # Handle API errors
-                user_channel = self.bot.get_channel(self.user_channel_id)
-                if user_channel:
-                    message = await user_channel.fetch_message(self.request_id)
-                    error_embed = discord.Embed(
-                        description=f":x: Withdrawal failed. Status Code: {response.status_code}, Response: {response.text}",
-                        color=discord.Color.red()
-                    )
-                    await message.edit(embed=error_embed)
-                await interaction.followup.send(
-                    f"Failed to process withdrawal. Status Code: {response.status_code}, Response: {response.text}",
-                    ephemeral=False
-                )
-
-        except Exception as e:
-            # Handle unexpected errors
-            print(f"Unexpected error during withdrawal: {str(e)}")
-            user_channel = self.bot.get_channel(self.user_channel_id)
-            if user_channel:
-                message = await user_channel.fetch_message(self.request_id)
-                error_embed = discord.Embed(
-                    description=":x: Withdrawal failed due to an unexpected error. Please contact support.",
-                    color=discord.Color.red()
-                )
-                await message.edit(embed=error_embed)
-            await interaction.followup.send(f"Error during withdrawal: {str(e)}", ephemeral=False)
-
-
-
-
-
+            self.bot.get_cog('WithdrawCog').pipeline.submit(job)
+        except asyncio.QueueFull:
+            for child in self.children:
+                child.disabled = False
+            await interaction.edit_original_response(view=self)
+            await interaction.followup.send("The withdrawal queue is full. Please try again shortly.", ephemeral=True)
+            return
 
+        await interaction.followup.send(f"Withdrawal for <@{self.user_id}> queued for processing.", ephemeral=True)
 
     @discord.ui.button(label="Deny", style=discord.ButtonStyle.red)
     async def deny(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -244,37 +104,70 @@ class AdminView(discord.ui.View):
         # Update the processing embed in the user's channel to show cancellation
         user_channel = self.bot.get_channel(self.user_channel_id)
         if user_channel:
-            message = await user_channel.fetch_message(self.request_id)
             deny_embed = discord.Embed(
                 description=":x: Withdrawal canceled by the admin.",
                 color=discord.Color.red()
             )
-            await message.edit(embed=deny_embed)
-
-def log_withdrawal(user_id, amount, currency, tx_hash, timestamp):
-    """Logs withdrawal details to withdrawals.json."""
-    try:
-        with open("withdrawals.json", "r") as f:
-            withdrawals = json.load(f)
-    except FileNotFoundError:
-        withdrawals = {}
-
-    if user_id not in withdrawals:
-        withdrawals[user_id] = []
-
-    withdrawals[user_id].append({
-        "currency": currency,
-        "amount": amount,
-        "tx_hash": tx_hash,
-        "timestamp": timestamp
-    })
+            self.bot.outbox.edit(user_channel.get_partial_message(self.request_id), NORMAL, embed=deny_embed)
 
-    with open("withdrawals.json", "w") as f:
-        json.dump(withdrawals, f, indent=4)
+# Map currency codes to full blockchain names for the explorer
+BLOCKCHAIN_NAMES = {
+    "btc": "bitcoin",
+    "ltc": "litecoin",
+    "eth": "ethereum",
+    "usdt@trx": "tether"
+}
 
 class WithdrawCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.pipeline = PayoutPipeline(
+            bot.http_client,
+            bot.prices,
+            bot.withdrawals,
+            account=os.getenv("account"),
+            transfer_key=os.getenv("transfer_key"),
+            on_sent=self._on_payout_sent,
+            on_failed=self._on_payout_failed,
+            workers=int(os.getenv("WITHDRAW_WORKERS", "2")),
+            batch_window=float(os.getenv("WITHDRAW_BATCH_WINDOW", "0"))
+        )
+
+    async def cog_load(self):
+        await self.pipeline.start()
+
+    async def cog_unload(self):
+        await self.pipeline.close()
+
+    async def _on_payout_sent(self, job: WithdrawalJob):
+        """Update the user's processing embed with the real TXID and the explorer link"""
+        blockchain_name = BLOCKCHAIN_NAMES.get(job.currency, job.currency)
+        explorer_url = f"https://blockchair.com/{blockchain_name}/transaction/{job.tx_hash}?from=apirone"
+
+        user_channel = self.bot.get_channel(job.user_channel_id)
+        if user_channel:
+            confirm_embed = discord.Embed(
+                description=f":white_check_mark: Withdrawal confirmed! Your {blockchain_name.capitalize()} payment of **${job.amount:.2f}** has been sent successfully.\n"
+                            f"Transaction ID: [View Transaction]({explorer_url})",
+                color=discord.Color.green()
+            )
+            self.bot.outbox.edit(user_channel.get_partial_message(job.request_id), NORMAL, embed=confirm_embed)
+            # Notify the user with a mention
+            self.bot.outbox.send(user_channel, NORMAL, content=f"<@{job.user_id}>, your withdrawal has been confirmed!")
+
+    async def _on_payout_failed(self, job: WithdrawalJob, reason: str):
+        """Show the failure on the user's processing embed and tell the admins"""
+        user_channel = self.bot.get_channel(job.user_channel_id)
+        if user_channel:
+            error_embed = discord.Embed(
+                description=f":x: {reason}",
+                color=discord.Color.red()
+            )
+            self.bot.outbox.edit(user_channel.get_partial_message(job.request_id), NORMAL, embed=error_embed)
+
+        admin_channel = self.bot.get_channel(job.admin_channel_id) if job.admin_channel_id else None
+        if admin_channel:
+            self.bot.outbox.send(admin_channel, NORMAL, content=f"Failed to process withdrawal for <@{job.user_id}> (request {job.request_id}): {reason}")
 
     @app_commands.command(name="withdraw", description="Withdraw your balance to a specified address")
     @app_commands.choices(currency=[
@@ -286,17 +179,11 @@ class WithdrawCog(commands.Cog):
     async def withdraw(self, interaction: discord.Interaction, currency: app_commands.Choice[str], amount: app_commands.Range[float, 0.01, None], address: str):
         user_id = str(interaction.user.id)
 
-        with open("balances.json", "r") as f:
-            balances = json.load(f)
-
-        if user_id not in balances or balances[user_id] < amount:
+        # Check and debit in one step, so two concurrent withdrawals can't spend the same balance
+        if await self.bot.ledger.try_debit(user_id, to_micros(amount), reason="withdrawal") is None:
             await interaction.response.send_message("You don't have enough balance to make this withdrawal.", ephemeral=True)
             return
 
-        balances[user_id] -= amount
-        with open("balances.json", "w") as f:
-            json.dump(balances, f, indent=4)
-
         embed = discord.Embed(
             title="Withdrawal Request",
             description=f"Currency: {currency.name}\nAmount: **${amount:.2f}**\nAddress: `{address}`\n\nPlease confirm or deny this request.",
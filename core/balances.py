@@ -0,0 +1,249 @@
+from array import array
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Union
+
+import numpy as np
+
+UserId = Union[int, str]
+
+EMPTY = -1  # Index cell holding no user; snowflakes are positive
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15  # Fibonacci hashing spreads snowflakes' low bits
+_MASK64 = (1 << 64) - 1
+
+
+class Account:
+    """One user's row of the balance table, built on demand for scan results"""
+
+    __slots__ = ("user_id", "balance", "changed_seq")
+
+    def __init__(self, user_id: int, balance: int, changed_seq: int):
+        self.user_id = user_id
+        self.balance = balance  # Micro-USD
+        self.changed_seq = changed_seq  # Ledger seq of the last change
+
+    def __repr__(self) -> str:
+        return f"Account({self.user_id}, {self.balance}, seq={self.changed_seq})"
+
+
+class SlotIndex:
+    """Open-addressing hash index from int64 user ids to table slots.
+
+    Keys and slots are two flat typed arrays probed linearly and kept at
+    most two-thirds full, about 20 bytes per user instead of a dict entry
+    with two boxed ints. Removal shifts the rest of the probe run back
+    instead of leaving tombstones.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._bits = max(capacity * 3 // 2, 1).bit_length()
+        self._keys = array("q", [EMPTY]) * (1 << self._bits)
+        self._slots = array("i", [0]) * (1 << self._bits)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _cell(self, key: int) -> int:
+        return ((key * _HASH_MULTIPLIER) & _MASK64) >> (64 - self._bits)
+
+    def _find(self, key: int) -> int:
+        """The cell holding key, or -1"""
+        keys = self._keys
+        mask = len(keys) - 1
+        cell = self._cell(key)
+        while True:
+            found = keys[cell]
+            if found == key:
+                return cell
+            if found == EMPTY:
+                return -1
+            cell = (cell + 1) & mask
+
+    def get(self, key: int) -> int:
+        """The slot of key, or -1"""
+        cell = self._find(key)
+        return self._slots[cell] if cell >= 0 else -1
+
+    def move(self, key: int, slot: int) -> None:
+        """Point an indexed key at another slot"""
+        self._slots[self._find(key)] = slot
+
+    def remove(self, key: int) -> int:
+        """Drop key and return its slot, or -1 if it wasn't indexed"""
+        cell = self._find(key)
+        if cell < 0:
+            return -1
+        keys, slots = self._keys, self._slots
+        mask = len(keys) - 1
+        slot = slots[cell]
+        hole, cell = cell, (cell + 1) & mask
+        while keys[cell] != EMPTY:
+            # An entry can fill the hole if the hole lies between its home cell and its cell
+            if (cell - self._cell(keys[cell])) & mask >= (cell - hole) & mask:
+                keys[hole], slots[hole] = keys[cell], slots[cell]
+                hole = cell
+            cell = (cell + 1) & mask
+        keys[hole] = EMPTY
+        self._size -= 1
+        return slot
+
+    def insert(self, key: int, slot: int) -> None:
+        """Add a key that isn't in the index yet"""
+        if (self._size + 1) * 3 > len(self._keys) * 2:
+            self._grow()
+        self._place(key, slot)
+        self._size += 1
+
+    def _place(self, key: int, slot: int) -> None:
+        keys = self._keys
+        mask = len(keys) - 1
+        cell = self._cell(key)
+        while keys[cell] != EMPTY:
+            cell = (cell + 1) & mask
+        keys[cell] = key
+        self._slots[cell] = slot
+
+    def _grow(self) -> None:
+        old_keys, old_slots = self._keys, self._slots
+        self._bits += 1
+        self._keys = array("q", [EMPTY]) * (1 << self._bits)
+        self._slots = array("i", [0]) * (1 << self._bits)
+        for key, slot in zip(old_keys, old_slots):
+            if key != EMPTY:
+                self._place(key, slot)
+
+
+class BalanceTable(Mapping):
+    """Every balance in contiguous int64 columns, addressed through a SlotIndex.
+
+    Row i holds a user's id, balance in micro-USD and the ledger seq of its
+    last change. Columns are array.array, so reads and writes are plain
+    Python ints; scans wrap them as NumPy views without copying. Views only
+    live inside a scan, since an array can't grow while a view exports it.
+
+    As a Mapping it is keyed by str(user_id), like the ledger's records.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._index = SlotIndex(capacity)
+        self._ids = array("q")
+        self._amounts = array("q")
+        self._changed = array("q")
+
+    @classmethod
+    def from_balances(cls, balances: Dict[str, int], seq: int) -> "BalanceTable":
+        """Build a table from a storage snapshot taken at seq"""
+        table = cls(len(balances))
+        for user_id, amount in balances.items():
+            table.set(user_id, amount, seq)
+        return table
+
+    def _slot(self, user_id: UserId) -> int:
+        try:
+            return self._index.get(int(user_id))
+        except (TypeError, ValueError):
+            raise KeyError(user_id) from None
+
+    def _slot_or_create(self, user_id: UserId) -> int:
+        key = int(user_id)
+        slot = self._index.get(key)
+        if slot < 0:
+            slot = len(self._ids)
+            self._ids.append(key)
+            self._amounts.append(0)
+            self._changed.append(0)
+            self._index.insert(key, slot)
+        return slot
+
+    # -----------------------------------------
+    # Mapping
+    # -----------------------------------------
+    def __getitem__(self, user_id: UserId) -> int:
+        slot = self._slot(user_id)
+        if slot < 0:
+            raise KeyError(user_id)
+        return self._amounts[slot]
+
+    def __contains__(self, user_id: object) -> bool:
+        try:
+            return self._slot(user_id) >= 0
+        except KeyError:
+            return False
+
+    def __iter__(self) -> Iterator[str]:
+        return (str(user_id) for user_id in self._ids)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    # -----------------------------------------
+    # Writes
+    # -----------------------------------------
+    def add(self, user_id: UserId, delta: int, seq: int) -> int:
+        """Add delta to a balance, opening the account if needed; returns the new balance"""
+        slot = self._slot_or_create(user_id)
+        self._amounts[slot] += delta
+        self._changed[slot] = seq
+        return self._amounts[slot]
+
+    def set(self, user_id: UserId, amount: int, seq: int) -> None:
+        slot = self._slot_or_create(user_id)
+        self._amounts[slot] = amount
+        self._changed[slot] = seq
+
+    def remove(self, user_id: UserId) -> None:
+        """Drop an account, moving the last row into its slot"""
+        slot = self._index.remove(int(user_id))
+        if slot < 0:
+            return
+        last = len(self._ids) - 1
+        if slot != last:
+            self._ids[slot] = self._ids[last]
+            self._amounts[slot] = self._amounts[last]
+            self._changed[slot] = self._changed[last]
+            self._index.move(self._ids[slot], slot)
+        self._ids.pop()
+        self._amounts.pop()
+        self._changed.pop()
+
+    # -----------------------------------------
+    # Scans
+    # -----------------------------------------
+    def _view(self, column: array) -> np.ndarray:
+        return np.frombuffer(column, dtype=np.int64) if column else np.zeros(0, dtype=np.int64)
+
+    def _accounts(self, slots: np.ndarray) -> List[Account]:
+        return [Account(self._ids[slot], self._amounts[slot], self._changed[slot]) for slot in slots.tolist()]
+
+    def changed_since(self, seq: int) -> Dict[str, int]:
+        """Balances changed after seq, keyed like storage snapshots"""
+        slots = np.flatnonzero(self._view(self._changed) > seq)
+        ids = self._view(self._ids)[slots].tolist()
+        amounts = self._view(self._amounts)[slots].tolist()
+        return {str(user_id): amount for user_id, amount in zip(ids, amounts)}
+
+    def total(self) -> int:
+        """Sum of every balance"""
+        return int(self._view(self._amounts).sum())
+
+    def top(self, count: int) -> List[Account]:
+        """The count largest balances, largest first"""
+        amounts = self._view(self._amounts)
+        if count <= 0:
+            return []
+        if count < len(amounts):
+            slots = np.argpartition(amounts, len(amounts) - count)[-count:]
+        else:
+            slots = np.arange(len(amounts))
+        return self._accounts(slots[np.argsort(amounts[slots], kind="stable")[::-1]])
+
+    def overdrawn(self) -> List[Account]:
+        """Accounts with a negative balance, which only unconditional debits can cause"""
+        return self._accounts(np.flatnonzero(self._view(self._amounts) < 0))
+
+    def account(self, user_id: UserId) -> Optional[Account]:
+        try:
+            slot = self._slot(user_id)
+        except KeyError:
+            return None
+        return Account(self._ids[slot], self._amounts[slot], self._changed[slot]) if slot >= 0 else None
@@ -0,0 +1,410 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Union
+
+from core.ledger import Ledger
+from core.money import to_micros
+from core.scheduler import Scheduler
+from core.sequence import SequenceAllocator
+from core.stats import StatsStore
+from core.storage import COINFLIP_FIELDS, Storage
+
+logger = logging.getLogger(__name__)
+
+BOT_OPPONENT = "PvP Bot"
+
+# Game states
+PENDING = "pending"  # Saved before the initiator's bet is debited
+OPEN = "open"
+JOINING = "joining"  # Saved before the opponent's bet is debited
+STARTED = "started"
+RESOLVED = "resolved"
+CANCELED = "canceled"
+EXPIRED = "expired"
+
+
+class CoinflipError(Exception):
+    """A coinflip action the user isn't allowed to take; the message is shown to them"""
+
+
+class CoinflipGame:
+    """Compact record of one coinflip game"""
+
+    __slots__ = ("game_number", "initiator_id", "amount", "side", "start_time", "opponent_id",
+                 "state", "result", "winner_id", "win_probability", "resolve_at", "channel_id", "message_id")
+
+    def __init__(self, game_number: int, initiator_id: int, amount: float, side: str, start_time: int):
+        self.game_number = game_number
+        self.initiator_id = initiator_id
+        self.amount = amount
+        self.side = side  # "heads" or "tails"
+        self.start_time = start_time
+        self.opponent_id: Optional[Union[int, str]] = None  # User id or BOT_OPPONENT
+        self.state = OPEN
+        self.result: Optional[str] = None  # "Heads" or "Tails" once resolved
+        self.winner_id: Optional[Union[int, str]] = None
+        self.win_probability = 0.5
+        self.resolve_at: Optional[int] = None  # Epoch deadline once started
+        self.channel_id: Optional[int] = None  # Where the game is rendered
+        self.message_id: Optional[int] = None
+
+    @property
+    def stake(self) -> int:
+        """The bet in ledger micro-USD; amount stays in dollars for display and stats"""
+        return to_micros(self.amount)
+
+    @property
+    def opponent_is_bot(self) -> bool:
+        return self.opponent_id == BOT_OPPONENT
+
+    @property
+    def other_side(self) -> str:
+        return "Heads" if self.side.lower() == "tails" else "Tails"
+
+    def to_record(self) -> Dict:
+        return {field: getattr(self, field) for field in COINFLIP_FIELDS}
+
+    @classmethod
+    def from_record(cls, record: Dict) -> "CoinflipGame":
+        game = cls(record["game_number"], int(record["initiator_id"]), record["amount"],
+                   record["side"], record["start_time"])
+        opponent_id = record.get("opponent_id")
+        game.opponent_id = int(opponent_id) if opponent_id not in (None, BOT_OPPONENT) else opponent_id
+        game.state = record["state"]
+        game.resolve_at = record.get("resolve_at")
+        game.channel_id = record.get("channel_id")
+        game.message_id = record.get("message_id")
+        game.win_probability = record.get("win_probability", 0.5)
+        return game
+
+
+class CoinflipEngine:
+    """All open coinflip games and their state transitions.
+
+    Games live in memory keyed by game number. Every state change settles
+    with a single ledger transaction; bets go through the ledger's atomic
+    try_debit, and a game is claimed before its bet is awaited, so
+    concurrent clicks can't double-spend or double-join. Started games are
+    resolved by the shared scheduler at their deadline.
+
+    Open games are checkpointed to storage and restored on startup; a reaper
+    refunds games nobody joined within open_ttl seconds in one transaction.
+    A bet is saved as PENDING or JOINING before it is debited under a
+    per-game ledger key, so after a crash start() can tell from the key
+    whether the money moved and finish or roll back the game. Games closed
+    outside an interaction go to the update handler for rendering.
+    """
+
+    def __init__(self, ledger: Ledger, storage: Storage, scheduler: Scheduler, numbers: SequenceAllocator,
+                 stats: StatsStore, countdown: int = 10, open_ttl: float = 120.0, reap_interval: float = 30.0):
+        self._ledger = ledger
+        self._storage = storage
+        self._scheduler = scheduler
+        self._numbers = numbers
+        self._stats = stats
+        self._countdown = countdown
+        self._open_ttl = open_ttl
+        self._reap_interval = reap_interval
+        self._games: Dict[int, CoinflipGame] = {}
+        self._on_update: Optional[Callable[[CoinflipGame], Awaitable[None]]] = None
+        self._reaper: Optional[asyncio.Task] = None
+
+    # -----------------------------------------
+    # Lifecycle
+    # -----------------------------------------
+    async def start(self) -> None:
+        """Restore checkpointed games and start the reaper"""
+        for record in await self._storage.load_games():
+            game = CoinflipGame.from_record(record)
+            if game.state in (PENDING, JOINING) and not await self._reconcile(game):
+                continue
+            self._games[game.game_number] = game
+            if game.state == STARTED:
+                self._schedule(game)  # Overdue games resolve right away
+        if self._games:
+            logger.info(f"Restored {len(self._games)} open coinflip games")
+        self._reaper = asyncio.create_task(self._reap_loop())
+
+    async def _reconcile(self, game: CoinflipGame) -> bool:
+        """Settle a game saved mid-bet by whether its bet reached the ledger; returns whether it stays"""
+        if game.state == PENDING:
+            if not self._ledger.has_applied(self._bet_key(game.game_number, game.initiator_id)):
+                logger.info(f"Dropping coinflip #{game.game_number}, its bet was never debited")
+                await self._storage.delete_games([game.game_number])
+                return False
+            game.state = OPEN
+        elif self._ledger.has_applied(self._bet_key(game.game_number, game.opponent_id)):
+            game.state = STARTED
+            game.resolve_at = int(time.time()) + self._countdown
+        else:
+            game.opponent_id = None
+            game.state = OPEN
+        await self._storage.save_game(game.to_record())
+        return True
+
+    @staticmethod
+    def _bet_key(game_number: int, user_id: int) -> str:
+        return f"coinflip:{game_number}:bet:{user_id}"
+
+    async def close(self) -> None:
+        if self._reaper:
+            # Let a reap in progress unwind before the ledger and storage close
+            self._reaper.cancel()
+            await asyncio.gather(self._reaper, return_exceptions=True)
+            self._reaper = None
+
+    def set_update_handler(self, handler: Optional[Callable[[CoinflipGame], Awaitable[None]]]) -> None:
+        """Register the coroutine that renders games resolved by the timer or expired by the reaper"""
+        self._on_update = handler
+
+    def get(self, game_number: int) -> Optional[CoinflipGame]:
+        return self._games.get(game_number)
+
+    def games(self) -> List[CoinflipGame]:
+        return list(self._games.values())
+
+    @property
+    def open_games(self) -> int:
+        return len(self._games)
+
+    def _require(self, game_number: int) -> CoinflipGame:
+        game = self._games.get(game_number)
+        if game is None:
+            raise CoinflipError("This coinflip is no longer active.")
+        return game
+
+    def _has_funds(self, user_id: int, micros: int) -> bool:
+        return self._ledger.has_account(user_id) and self._ledger.get_balance(user_id) >= micros
+
+    async def attach(self, game_number: int, channel_id: int, message_id: int) -> None:
+        """Remember the message a game is rendered in"""
+        game = self._games.get(game_number)
+        if game is None:
+            return
+        game.channel_id = channel_id
+        game.message_id = message_id
+        await self._try_checkpoint(game)
+
+    async def _checkpoint(self, game: CoinflipGame) -> None:
+        """Save a live game or delete a closed one; storage errors are raised"""
+        if game.game_number in self._games:
+            await self._storage.save_game(game.to_record())
+        else:
+            await self._storage.delete_games([game.game_number])
+
+    async def _try_checkpoint(self, game: CoinflipGame) -> None:
+        """Checkpoint after a change that already settled and can't be refused any more"""
+        try:
+            await self._checkpoint(game)
+        except Exception as e:
+            logger.error(f"Error checkpointing coinflip #{game.game_number}: {e}")
+
+    def _start(self, game: CoinflipGame) -> None:
+        game.state = STARTED
+        game.resolve_at = int(time.time()) + self._countdown
+        self._schedule(game)
+
+    def _schedule(self, game: CoinflipGame) -> None:
+        self._scheduler.call_at(game.resolve_at, lambda: self._resolve_due(game.game_number))
+
+    async def _resolve_due(self, game_number: int) -> None:
+        game = await self.resolve(game_number)
+        if self._on_update:
+            await self._on_update(game)
+
+    # -----------------------------------------
+    # Operations
+    # -----------------------------------------
+    async def create(self, user_id: int, amount: float, side: str) -> CoinflipGame:
+        """Take the initiator's bet and open a new game"""
+        stake = to_micros(amount)
+        if not self._has_funds(user_id, stake):
+            raise CoinflipError("You don't have enough balance to place this bet.")
+        game_number = await self._numbers.next()
+        game = CoinflipGame(game_number, user_id, amount, side, int(time.time()))
+        game.state = PENDING
+        try:
+            await self._storage.save_game(game.to_record())
+        except Exception as e:
+            logger.error(f"Error saving coinflip #{game_number}: {e}")
+            raise CoinflipError("Couldn't save the game, please try again.") from e
+
+        # The balance may have moved meanwhile; the debit itself is the authoritative check
+        try:
+            debited = await self._ledger.try_debit(user_id, stake, f"coinflip #{game_number} bet",
+                                                   key=self._bet_key(game_number, user_id))
+        except Exception:
+            await self._discard(game)
+            raise
+        if debited is None:
+            await self._discard(game)
+            raise CoinflipError("You don't have enough balance to place this bet.")
+
+        game.state = OPEN
+        self._games[game_number] = game
+        await self._try_checkpoint(game)  # A PENDING record left behind is reopened on restart
+        return game
+
+    async def _discard(self, game: CoinflipGame) -> None:
+        """Delete the record of a game whose bet didn't go through"""
+        try:
+            await self._storage.delete_games([game.game_number])
+        except Exception as e:
+            # Without its bet key the record is dropped on restart anyway
+            logger.error(f"Error deleting coinflip #{game.game_number}: {e}")
+
+    async def join(self, game_number: int, user_id: int) -> CoinflipGame:
+        """Take the opponent's bet and start the game"""
+        game = self._require(game_number)
+        if not self._has_funds(user_id, game.stake):
+            raise CoinflipError("You don't have enough balance to join this game.")
+        if user_id == game.initiator_id:
+            raise CoinflipError("You can't join your own game!")
+        if game.state != OPEN:
+            raise CoinflipError("Someone has already joined the game.")
+
+        # Claim the game before awaiting the bet, so a second joiner is turned away
+        game.opponent_id = user_id
+        game.state = JOINING
+        try:
+            await self._checkpoint(game)
+        except Exception as e:
+            game.opponent_id = None
+            game.state = OPEN
+            logger.error(f"Error saving coinflip #{game_number}: {e}")
+            raise CoinflipError("Couldn't join the game, please try again.") from e
+
+        try:
+            debited = await self._ledger.try_debit(user_id, game.stake, f"coinflip #{game_number} bet",
+                                                   key=self._bet_key(game_number, user_id))
+        except Exception:
+            await self._reopen(game)
+            raise
+        if debited is None:
+            await self._reopen(game)
+            raise CoinflipError("You don't have enough balance to join this game.")
+        self._start(game)
+        await self._try_checkpoint(game)  # A JOINING record left behind is started on restart
+        return game
+
+    async def _reopen(self, game: CoinflipGame) -> None:
+        """Release a claimed game whose opponent's bet didn't go through"""
+        game.opponent_id = None
+        game.state = OPEN
+        # Without the opponent's bet key a JOINING record is reopened on restart anyway
+        await self._try_checkpoint(game)
+
+    async def call_bot(self, game_number: int, user_id: int) -> CoinflipGame:
+        """Start the game against the bot"""
+        game = self._require(game_number)
+        if user_id != game.initiator_id:
+            raise CoinflipError("Only the game creator can call the bot.")
+        if game.state != OPEN:
+            raise CoinflipError("Someone has already joined the game.")
+
+        game.opponent_id = BOT_OPPONENT
+        game.state = STARTED
+        game.resolve_at = int(time.time()) + self._countdown
+        try:
+            await self._checkpoint(game)
+        except Exception as e:
+            game.opponent_id = None
+            game.state = OPEN
+            game.resolve_at = None
+            logger.error(f"Error saving coinflip #{game_number}: {e}")
+            raise CoinflipError("Couldn't start the game, please try again.") from e
+        self._schedule(game)
+        return game
+
+    async def cancel(self, game_number: int, user_id: int) -> CoinflipGame:
+        """Refund the initiator and close an unjoined game"""
+        game = self._require(game_number)
+        if user_id != game.initiator_id:
+            raise CoinflipError("Only the game initiator can cancel the game.")
+        if game.state != OPEN:
+            raise CoinflipError("You can't cancel the game after someone has joined or the bot has been called.")
+
+        game.state = CANCELED
+        del self._games[game_number]
+        if self._ledger.has_account(game.initiator_id):
+            await self._ledger.transact({game.initiator_id: game.stake}, f"coinflip #{game_number} refund")
+        await self._try_checkpoint(game)
+        return game
+
+    async def resolve(self, game_number: int) -> CoinflipGame:
+        """Flip the coin for a started game and pay the winner"""
+        game = self._require(game_number)
+        if game.state != STARTED:
+            raise CoinflipError("This coinflip hasn't started yet.")
+
+        user_balance = self._ledger.get_balance(game.initiator_id)
+        game.result = self._flip(game, user_balance)
+        initiator_won = game.result.lower() == game.side.lower()
+        game.winner_id = game.initiator_id if initiator_won else game.opponent_id
+        if initiator_won:
+            game.win_probability = max(game.win_probability - 0.1, 0.1)
+
+        game.state = RESOLVED
+        del self._games[game_number]
+        for player_id in (game.initiator_id, game.opponent_id):
+            if player_id != BOT_OPPONENT:
+                self._stats.record_wager(player_id, game.amount)
+        # Winner gets double their bet; the bot has no account to pay
+        if game.winner_id != BOT_OPPONENT and self._ledger.has_account(game.winner_id):
+            await self._ledger.transact({game.winner_id: game.stake * 2}, f"coinflip #{game_number} payout")
+        await self._try_checkpoint(game)
+        return game
+
+    # -----------------------------------------
+    # Reaper
+    # -----------------------------------------
+    async def reap(self) -> List[CoinflipGame]:
+        """Expire unjoined games past open_ttl and refund them in one transaction"""
+        deadline = time.time() - self._open_ttl
+        expired = [game for game in self._games.values() if game.state == OPEN and game.start_time <= deadline]
+        if not expired:
+            return []
+
+        refunds: Dict[int, int] = {}
+        for game in expired:
+            game.state = EXPIRED
+            del self._games[game.game_number]
+            if self._ledger.has_account(game.initiator_id):
+                refunds[game.initiator_id] = refunds.get(game.initiator_id, 0) + game.stake
+        if refunds:
+            await self._ledger.transact(refunds, f"coinflip refund for {len(expired)} expired games")
+        try:
+            await self._storage.delete_games([game.game_number for game in expired])
+        except Exception as e:
+            logger.error(f"Error deleting expired coinflips: {e}")
+        logger.info(f"Expired {len(expired)} coinflip games")
+        return expired
+
+    async def _reap_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._reap_interval)
+            try:
+                expired = await self.reap()
+            except Exception as e:
+                logger.error(f"Error reaping coinflips: {e}")
+                continue
+            for game in expired:
+                if self._on_update:
+                    try:
+                        await self._on_update(game)
+                    except Exception as e:
+                        logger.error(f"Error rendering expired coinflip #{game.game_number}: {e}")
+
+    # -----------------------------------------
+    # Outcome
+    # -----------------------------------------
+    @staticmethod
+    def _flip(game: CoinflipGame, user_balance: int) -> str:
+        """Determine the coinflip result based on the bet-to-balance ratio and win probability"""
+        if game.stake > 0.8 * user_balance:
+            return game.other_side
+        if random.random() < game.win_probability:
+            return game.side.capitalize()
+        return game.other_side
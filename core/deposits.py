@@ -0,0 +1,89 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from core.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+# (user_id, value, currency, tx_hash, input_address) -> credited, False for a duplicate
+DepositCredit = Callable[[str, float, str, str, str], Awaitable[bool]]
+
+
+class PendingDeposits:
+    """Confirmed deposits kept in storage until the ledger has credited them.
+
+    Apirone's callback is acknowledged before the deposit is processed, so it
+    won't be resent. Each deposit is saved before its first credit attempt
+    and deleted once the credit lands or turns out to be a duplicate; a
+    failed attempt (no USD price yet, a ledger error) is retried every
+    retry_interval seconds, across restarts too. The ledger's deposit key
+    keeps retries from crediting twice.
+    """
+
+    def __init__(self, storage: Storage, credit: DepositCredit, retry_interval: float = 60.0):
+        self._storage = storage
+        self._credit = credit
+        self._retry_interval = retry_interval
+        self._pending: Dict[str, Dict] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        for record in await self._storage.load_pending_deposits():
+            self._pending[record["key"]] = record
+        if self._pending:
+            logger.info(f"{len(self._pending)} confirmed deposits awaiting credit")
+        self._task = asyncio.create_task(self._retry_loop())
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._pending:
+            logger.warning(f"{len(self._pending)} deposits still awaiting credit, retrying on next start")
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def submit(self, key: str, user_id: str, value: float, currency: str, tx_hash: str,
+                     input_address: str) -> bool:
+        """Persist a confirmed deposit, then credit it.
+
+        Returns whether it was credited. If the attempt fails the deposit
+        stays queued for retry and the error is re-raised.
+        """
+        record = {
+            "key": key,
+            "user_id": str(user_id),
+            "value": value,
+            "currency": currency,
+            "tx_hash": tx_hash,
+            "input_address": input_address,
+            "received_at": int(time.time())
+        }
+        await self._storage.save_pending_deposit(record)
+        self._pending[key] = record
+        try:
+            return await self._attempt(record)
+        except Exception as e:
+            logger.warning(f"Crediting deposit {tx_hash} failed, will retry: {e}")
+            raise
+
+    async def _attempt(self, record: Dict) -> bool:
+        credited = await self._credit(record["user_id"], record["value"], record["currency"],
+                                      record["tx_hash"], record["input_address"])
+        self._pending.pop(record["key"], None)
+        await self._storage.delete_pending_deposit(record["key"])
+        return credited
+
+    async def _retry_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._retry_interval)
+            for record in list(self._pending.values()):
+                try:
+                    await self._attempt(record)
+                    logger.info(f"Credited deposit {record['tx_hash']} on retry")
+                except Exception as e:
+                    logger.warning(f"Retrying deposit {record['tx_hash']} failed: {e}")
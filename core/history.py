@@ -0,0 +1,103 @@
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from core.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+# History kinds, named after their storage tables
+DEPOSITS = "deposits"
+WITHDRAWALS = "withdrawals"
+
+
+class HistoryPage:
+    """One page of a user's history, newest first"""
+
+    __slots__ = ("records", "has_newer", "has_older")
+
+    def __init__(self, records: List[Dict], has_newer: bool, has_older: bool):
+        self.records = records
+        self.has_newer = has_newer
+        self.has_older = has_older
+
+    @property
+    def first_id(self) -> Optional[int]:
+        return self.records[0]["id"] if self.records else None
+
+    @property
+    def last_id(self) -> Optional[int]:
+        return self.records[-1]["id"] if self.records else None
+
+
+class HistoryStore:
+    """Paged deposit and withdrawal history with cached per-user summaries.
+
+    Pages are read with keyset cursors on the (user_id, id) index, so a page
+    costs the same however long the history is. Each user's record count and
+    amount total is loaded once and then kept current as records are added.
+    """
+
+    def __init__(self, storage: Storage):
+        self._storage = storage
+        self._summaries: Dict[Tuple[str, str], List] = {}  # (kind, user_id) -> [count, total]
+        # Summary queries in flight, each with the [count, total] added since it was queued
+        self._loading: Dict[Tuple[str, str], List[List]] = {}
+
+    def _count(self, kind: str, user_id: str, amount: float) -> None:
+        key = (kind, user_id)
+        for summary in [self._summaries.get(key), *self._loading.get(key, ())]:
+            if summary is not None:
+                summary[0] += 1
+                summary[1] += amount
+
+    async def _add(self, kind: str, user_id, record: Dict) -> None:
+        user_id = str(user_id)
+        # Counted before the write is queued: storage runs requests in order, so a
+        # summary load queued earlier won't include this record
+        self._count(kind, user_id, record.get("amount", 0.0))
+        try:
+            if kind == DEPOSITS:
+                await self._storage.add_deposit(user_id, record)
+            else:
+                await self._storage.add_withdrawal(user_id, record)
+        except Exception:
+            self._summaries.pop((kind, user_id), None)  # Reloaded on the next summary
+            raise
+
+    async def add_deposit(self, user_id, record: Dict) -> None:
+        await self._add(DEPOSITS, user_id, record)
+
+    async def add_withdrawal(self, user_id, record: Dict) -> None:
+        await self._add(WITHDRAWALS, user_id, record)
+
+    async def summary(self, kind: str, user_id) -> Tuple[int, float]:
+        """(record count, amount total) for a user, queried from storage only on a cache miss"""
+        user_id = str(user_id)
+        key = (kind, user_id)
+        summary = self._summaries.get(key)
+        if summary is None:
+            added = [0, 0.0]
+            self._loading.setdefault(key, []).append(added)
+            try:
+                # Queued before this coroutine yields, so the query sees exactly the
+                # records added before now and `added` collects the rest
+                count, total = await self._storage.get_history_summary(kind, user_id)
+            finally:
+                loading = [pending for pending in self._loading[key] if pending is not added]
+                if loading:
+                    self._loading[key] = loading
+                else:
+                    del self._loading[key]
+            summary = self._summaries.setdefault(key, [count + added[0], total + added[1]])
+        return summary[0], summary[1]
+
+    async def page(self, kind: str, user_id, limit: int = 10, before: Optional[int] = None,
+                   after: Optional[int] = None) -> HistoryPage:
+        """A page of up to limit records older than before or newer than after (newest page by default)"""
+        records = await self._storage.get_history_page(kind, str(user_id), limit + 1, before, after)
+        if after is not None:
+            # Fetched upwards from the cursor: the extra record is the newest one
+            more, records = len(records) > limit, records[-limit:]
+            return HistoryPage(records, has_newer=more, has_older=True)
+        more, records = len(records) > limit, records[:limit]
+        return HistoryPage(records, has_newer=before is not None, has_older=more)
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class HttpResponse:
+    """A fully read response, so retries never leak open connections"""
+
+    def __init__(self, status: int, body: bytes):
+        self.status = status
+        self.body = body
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+    @property
+    def text(self) -> str:
+        return self.body.decode(errors="replace")
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+
+class EndpointStats:
+    """Request counters and latency for one named endpoint"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def observe(self, latency: float, failed: bool) -> None:
+        self.requests += 1
+        self.errors += failed
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "avg_ms": (self.total_latency / self.requests * 1000) if self.requests else 0.0,
+            "max_ms": self.max_latency * 1000
+        }
+
+
+class HttpClient:
+    """Bot-wide pooled aiohttp client for Apirone, CoinGecko and ngrok traffic.
+
+    Connections are kept alive and capped per host; requests get a timeout and
+    retry with exponential backoff on transient failures. GETs retry by
+    default, POSTs only when the caller opts in, so non-idempotent calls such
+    as transfers are sent at most once.
+    """
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 10, timeout: float = 15.0,
+                 keepalive_timeout: float = 60.0):
+        self._limit = limit
+        self._limit_per_host = limit_per_host
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+        self._keepalive_timeout = keepalive_timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._stats: Dict[str, EndpointStats] = {}
+
+    async def start(self) -> None:
+        connector = aiohttp.TCPConnector(
+            limit=self._limit,
+            limit_per_host=self._limit_per_host,
+            keepalive_timeout=self._keepalive_timeout,
+            ttl_dns_cache=300
+        )
+        self._session = aiohttp.ClientSession(connector=connector, timeout=self._timeout)
+
+    async def close(self) -> None:
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    async def request(self, method: str, url: str, endpoint: str, retries: int = 0,
+                      backoff: float = 0.5, timeout: Optional[float] = None, **kwargs) -> HttpResponse:
+        """Send a request and read the whole body.
+
+        endpoint names the call for metrics. Connection errors, timeouts and
+        429/5xx responses are retried up to `retries` times.
+        """
+        if timeout is not None:
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout)
+        stats = self._stats.setdefault(endpoint, EndpointStats())
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                async with self._session.request(method, url, **kwargs) as response:
+                    result = HttpResponse(response.status, await response.read())
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                stats.observe(time.perf_counter() - start, failed=True)
+                if attempt >= retries:
+                    raise
+                logger.warning(f"{endpoint} request failed ({e!r}), retrying")
+            else:
+                failed = result.status in RETRY_STATUSES
+                stats.observe(time.perf_counter() - start, failed=failed or not result.ok)
+                if not failed or attempt >= retries:
+                    return result
+                logger.warning(f"{endpoint} returned {result.status}, retrying")
+
+            attempt += 1
+            stats.retries += 1
+            await asyncio.sleep(backoff * 2 ** (attempt - 1))
+
+    async def get(self, url: str, endpoint: str, retries: int = 2, **kwargs) -> HttpResponse:
+        return await self.request("GET", url, endpoint, retries=retries, **kwargs)
+
+    async def post(self, url: str, endpoint: str, retries: int = 0, **kwargs) -> HttpResponse:
+        return await self.request("POST", url, endpoint, retries=retries, **kwargs)
+
+    def metrics(self) -> Dict[str, Dict[str, float]]:
+        """Per-endpoint request counts and latency"""
+        return {endpoint: stats.as_dict() for endpoint, stats in self._stats.items()}
@@ -0,0 +1,119 @@
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class Journal:
+    """Append-only write-ahead log of ledger mutations.
+
+    Every record is one JSON line, written and fsync'd on a single dedicated
+    thread so appends keep their order and never block the event loop. A
+    failed append is cut back off the file, so it can't resurface on replay
+    or hide the records after it; if even that fails, the journal refuses
+    further appends.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="journal")
+        self.pending_records = 0
+        self._broken = False
+
+    def open(self) -> List[Dict]:
+        """Open the journal for appending and return the records already in it.
+
+        A torn record at the tail (crash mid-append) is cut off so the next
+        append starts on a clean line.
+        """
+        records = []
+        good_offset = 0
+        try:
+            with open(self.path, "rb") as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            # Valid JSON missing its newline would swallow the next append
+                            raise ValueError("unterminated record")
+                        records.append(json.loads(line))
+                    except ValueError:  # Includes JSONDecodeError and UnicodeDecodeError
+                        logger.warning(f"Discarding torn journal tail in {self.path} at byte {good_offset}")
+                        break
+                    good_offset += len(line)
+        except FileNotFoundError:
+            pass
+
+        self._file = open(self.path, "ab", buffering=0)
+        if self._file.tell() != good_offset:
+            self._file.truncate(good_offset)
+            os.fsync(self._file.fileno())
+        self.pending_records = len(records)
+        return records
+
+    def _append_sync(self, line: bytes) -> None:
+        if self._broken:
+            raise OSError(f"Journal {self.path} is unusable after a failed append")
+        offset = self._file.tell()
+        try:
+            # Unbuffered, so a failed write leaves nothing behind to be flushed later
+            if self._file.write(line) != len(line):
+                raise OSError(f"Short write to journal {self.path}")
+            os.fsync(self._file.fileno())
+        except Exception:
+            try:
+                self._file.truncate(offset)
+                self._file.seek(offset)
+                os.fsync(self._file.fileno())
+            except Exception as e:
+                self._broken = True
+                logger.critical(f"Could not cut a failed append off {self.path}, refusing further writes: {e}")
+            raise
+
+    async def append(self, record: Dict) -> None:
+        """Durably append one record; if this raises, the record isn't in the journal"""
+        line = (json.dumps(record, separators=(",", ":")) + "\n").encode()
+        self.pending_records += 1
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._executor, self._append_sync, line)
+        except Exception:
+            self.pending_records -= 1
+            raise
+
+    def _truncate_sync(self, seq: int) -> int:
+        self._file.close()
+        kept = []
+        with open(self.path, "rb") as f:
+            for line in f:
+                if json.loads(line)["seq"] > seq:
+                    kept.append(line)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.writelines(kept)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, "ab", buffering=0)
+        return len(kept)
+
+    async def truncate_through(self, seq: int) -> None:
+        """Drop every record up to and including seq once a snapshot covers it.
+
+        Runs on the append thread, so records appended while the snapshot was
+        being written are kept and later appends land after them.
+        """
+        submitted = self.pending_records
+        loop = asyncio.get_running_loop()
+        kept = await loop.run_in_executor(self._executor, self._truncate_sync, seq)
+        # Appends queued behind the truncation aren't in kept
+        self.pending_records = kept + self.pending_records - submitted
+
+    async def close(self) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._file.close)
+        self._executor.shutdown(wait=True)
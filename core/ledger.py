@@ -0,0 +1,296 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Mapping, Optional, Set, Union
+
+from core.balances import Account, BalanceTable
+from core.journal import Journal
+from core.locks import LockTable
+from core.money import to_micros, to_usd
+from core.storage import BALANCE_UNIT, Storage
+
+logger = logging.getLogger(__name__)
+
+UserId = Union[int, str]
+
+
+class Ledger:
+    """Authoritative in-memory balance ledger shared by every cog.
+
+    Balances and amounts are integer micro-USD (see core.money), so ledger
+    arithmetic is exact; callers convert dollars at the edges. They live in
+    a BalanceTable of int64 columns, which also records the seq of each
+    account's last change, so compaction and audits are array scans.
+
+    Each mutation is applied in memory and appended to a write-ahead journal as
+    one small fsync'd record. A background compactor periodically folds the
+    changed balances into the storage snapshot; startup replays snapshot +
+    journal.
+
+    A record can carry an idempotency key (e.g. a deposit's tx hash). Keys
+    are kept in a set, journaled with their record and snapshotted with the
+    balances, so a keyed change is applied at most once across retries and
+    restarts.
+
+    Every mutation holds its users' locks from the balance check until its
+    record is durable, using a striped lock table, so conditional debits see
+    committed balances and only operations on the same users wait on each
+    other. Lock-free readers can see a change while its append is in flight;
+    if the append fails the change is reverted before the error reaches the
+    caller. Compaction takes every lock while it captures the snapshot, so
+    it never folds in a change that isn't journaled yet.
+    """
+
+    def __init__(self, storage: Storage, journal_path: str = "balances.json.wal",
+                 compact_interval: float = 300.0, compact_threshold: int = 10_000, lock_stripes: int = 256):
+        self._storage = storage
+        self._locks = LockTable(lock_stripes)
+        self._compact_interval = compact_interval
+        self._compact_threshold = compact_threshold
+        self._journal = Journal(journal_path)
+        self._balances = BalanceTable()
+        self._snapshot_seq = 0  # Changes after this seq aren't in the storage snapshot yet
+        self._keys: Set[str] = set()
+        self._new_keys: Set[str] = set()  # Keys not yet in the storage snapshot
+        self._seq = 0
+        self._compact_needed: Optional[asyncio.Event] = None
+        self._compact_task: Optional[asyncio.Task] = None
+
+    # -----------------------------------------
+    # Lifecycle
+    # -----------------------------------------
+    async def start(self) -> None:
+        """Load the snapshot, replay the journal and start the compactor"""
+        self._seq, balances = await self._storage.load_balances()
+        self._balances = BalanceTable.from_balances(balances, self._seq)
+        self._snapshot_seq = self._seq
+        self._keys = await self._storage.load_ledger_keys()
+        records = await asyncio.to_thread(self._journal.open)
+        replayed = 0
+        for record in records:
+            if record["seq"] <= self._seq:
+                continue  # Already folded into the snapshot
+            self._apply(upgrade_record(record))
+            self._seq = record["seq"]
+            replayed += 1
+        if replayed:
+            logger.info(f"Replayed {replayed} journal records")
+        self._compact_needed = asyncio.Event()
+        self._compact_task = asyncio.create_task(self._compact_loop())
+        logger.info(f"Ledger loaded {len(self._balances)} accounts holding ${to_usd(self._balances.total()):,.2f} (seq {self._seq})")
+        overdrawn = self._balances.overdrawn()
+        if overdrawn:
+            logger.warning(f"{len(overdrawn)} accounts are overdrawn: {overdrawn[:10]}")
+
+    async def close(self) -> None:
+        """Stop the compactor, fold the journal into a snapshot and close it"""
+        if self._compact_task:
+            self._compact_task.cancel()
+            try:
+                await self._compact_task
+            except asyncio.CancelledError:
+                pass
+            self._compact_task = None
+        await self.compact()
+        await self._journal.close()
+
+    async def compact(self) -> None:
+        """Fold the journal into the storage snapshot"""
+        if not self._journal.pending_records:
+            return
+        async with self._locks.hold_all():
+            seq = self._seq
+            changes = self._balances.changed_since(self._snapshot_seq)
+            keys, self._new_keys = self._new_keys, set()
+        try:
+            await self._storage.save_balances(seq, changes, keys)
+            self._snapshot_seq = seq
+            await self._journal.truncate_through(seq)
+            logger.info(f"Ledger compacted {len(changes)} accounts at seq {seq}")
+        except Exception as e:
+            self._new_keys.update(keys)
+            logger.error(f"Error compacting ledger: {e}")
+
+    async def _compact_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._compact_needed.wait(), timeout=self._compact_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._compact_needed.clear()
+            await self.compact()
+
+    # -----------------------------------------
+    # Reads
+    # -----------------------------------------
+    def has_account(self, user_id: UserId) -> bool:
+        return user_id in self._balances
+
+    def get_balance(self, user_id: UserId) -> int:
+        return self._balances.get(user_id, 0)
+
+    def has_applied(self, key: str) -> bool:
+        """Whether a record with this idempotency key is already in the ledger"""
+        return key in self._keys
+
+    def balances(self) -> Mapping[str, int]:
+        """Read-only view of every balance"""
+        return self._balances
+
+    def total(self) -> int:
+        """Sum of every balance, for audits"""
+        return self._balances.total()
+
+    def top(self, count: int = 10) -> List[Account]:
+        """The accounts with the largest balances, largest first"""
+        return self._balances.top(count)
+
+    # -----------------------------------------
+    # Mutations
+    # -----------------------------------------
+    def _apply(self, record: Dict) -> None:
+        if "key" in record:
+            self._keys.add(record["key"])
+            self._new_keys.add(record["key"])
+        seq = record["seq"]
+        if record["op"] == "txn":
+            for user_id, amount in record["deltas"].items():
+                self._balances.add(user_id, amount, seq)
+            return
+        user_id, amount = record["user"], record["amount"]
+        if record["op"] == "set":
+            self._balances.set(user_id, amount, seq)
+        elif record["op"] == "credit":
+            self._balances.add(user_id, amount, seq)
+        elif record["op"] == "debit":
+            self._balances.add(user_id, -amount, seq)
+
+    def _record(self, op: str, reason: str, **fields) -> Dict:
+        self._seq += 1
+        return {"seq": self._seq, "op": op, **fields, "reason": reason, "ts": int(time.time()), "unit": BALANCE_UNIT}
+
+    async def _write(self, record: Dict) -> None:
+        """Apply a record in memory, then journal it; callers hold the locks of its users.
+
+        If the append fails the record is reverted before the error is raised,
+        so memory never keeps a balance or key the journal doesn't have.
+        """
+        users = record["deltas"] if record["op"] == "txn" else (record["user"],)
+        before = {user_id: self._balances.account(user_id) for user_id in users}
+        self._apply(record)
+        try:
+            await self._journal.append(record)
+        except Exception as e:
+            self._revert(record, before)
+            logger.error(f"Journal append failed, reverted ledger record {record['seq']}: {e}")
+            raise
+        if self._journal.pending_records >= self._compact_threshold and self._compact_needed:
+            self._compact_needed.set()
+
+    def _revert(self, record: Dict, before: Dict[str, Optional[Account]]) -> None:
+        for user_id, account in before.items():
+            if account is None:
+                self._balances.remove(user_id)
+            else:
+                self._balances.set(user_id, account.balance, account.changed_seq)
+        if "key" in record:
+            self._keys.discard(record["key"])
+            self._new_keys.discard(record["key"])
+        if self._seq == record["seq"]:
+            self._seq -= 1  # Otherwise a later record took the next seq; the gap is harmless
+
+    async def _commit(self, op: str, user_id: UserId, amount: int, reason: str) -> int:
+        async with self._locks.hold(str(user_id)):
+            await self._write(self._record(op, reason, user=str(user_id), amount=amount))
+            return self.get_balance(user_id)
+
+    async def credit(self, user_id: UserId, amount: int, reason: str = "") -> int:
+        """Add amount to a user's balance and return the new balance"""
+        return await self._commit("credit", user_id, amount, reason)
+
+    async def credit_once(self, key: str, user_id: UserId, amount: int, reason: str = "") -> Optional[int]:
+        """Credit amount unless a record with this key was already applied.
+
+        Returns the new balance, or None for a duplicate. The check and the
+        credit are one step under the user's lock, so concurrent retries
+        credit once.
+        """
+        async with self._locks.hold(str(user_id)):
+            if key in self._keys:
+                return None
+            await self._write(self._record("credit", reason, user=str(user_id), amount=amount, key=key))
+            return self.get_balance(user_id)
+
+    async def debit(self, user_id: UserId, amount: int, reason: str = "") -> int:
+        """Subtract amount from a user's balance unconditionally and return the new balance"""
+        return await self._commit("debit", user_id, amount, reason)
+
+    async def try_debit(self, user_id: UserId, amount: int, reason: str = "",
+                        key: Optional[str] = None) -> Optional[int]:
+        """Debit amount only if the user has an account holding at least that much.
+
+        Returns the new balance, or None if the funds weren't there or a
+        record with key was already applied. The check and the debit are one
+        step under the user's lock, so concurrent commands can't both spend
+        the same balance.
+        """
+        async with self._locks.hold(str(user_id)):
+            if key is not None and key in self._keys:
+                return None
+            if not self.has_account(user_id) or self.get_balance(user_id) < amount:
+                return None
+            fields = {"key": key} if key is not None else {}
+            await self._write(self._record("debit", reason, user=str(user_id), amount=amount, **fields))
+            return self.get_balance(user_id)
+
+    async def transfer(self, sender_id: UserId, recipient_id: UserId, amount: int,
+                       reason: str = "") -> Optional[Dict[str, int]]:
+        """Move amount between two users as one journal record, if the sender can cover it.
+
+        Returns both new balances, or None if the sender's funds weren't there.
+        Raises ValueError for a transfer to oneself.
+        """
+        sender_id, recipient_id = str(sender_id), str(recipient_id)
+        if sender_id == recipient_id:
+            raise ValueError("Can't transfer to the sending account")
+        async with self._locks.hold(sender_id, recipient_id):
+            if not self.has_account(sender_id) or self.get_balance(sender_id) < amount:
+                return None
+            record = self._record("txn", reason, deltas={sender_id: -amount, recipient_id: amount})
+            await self._write(record)
+            return {user_id: self._balances[user_id] for user_id in record["deltas"]}
+
+    async def transact(self, deltas: Mapping[UserId, int], reason: str = "") -> Dict[str, int]:
+        """Apply several balance changes unconditionally as one journal record.
+
+        deltas maps user ids to signed amounts. Returns the new balance of
+        every user touched.
+        """
+        deltas = {str(user_id): amount for user_id, amount in deltas.items()}
+        async with self._locks.hold(*deltas):
+            await self._write(self._record("txn", reason, deltas=deltas))
+            return {user_id: self._balances[user_id] for user_id in deltas}
+
+    async def set_balance(self, user_id: UserId, amount: int, reason: str = "") -> int:
+        """Overwrite a user's balance and return the previous one"""
+        async with self._locks.hold(str(user_id)):
+            old_balance = self.get_balance(user_id)
+            await self._write(self._record("set", reason, user=str(user_id), amount=amount))
+            return old_balance
+
+
+def upgrade_record(record: Dict) -> Dict:
+    """Convert a journal record written in dollars to micro-USD.
+
+    Records in micro-USD carry the same "unit" marker as balances.json;
+    any record without it predates integer balances, whatever the type of
+    its amounts (a debit of 1 there means $1).
+    """
+    if record.get("unit") == BALANCE_UNIT:
+        return record
+    if "deltas" in record:
+        record["deltas"] = {user_id: to_micros(float(amount)) for user_id, amount in record["deltas"].items()}
+    elif "amount" in record:
+        record["amount"] = to_micros(float(record["amount"]))
+    record["unit"] = BALANCE_UNIT
+    return record
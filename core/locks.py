@@ -0,0 +1,44 @@
+import asyncio
+import zlib
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Hashable, List
+
+
+class LockTable:
+    """Per-key asyncio locks striped over a fixed number of locks.
+
+    Keys hash onto one of the stripes, so memory stays constant however many
+    users there are, and two keys only contend when they share a stripe.
+    Several keys are locked in stripe order, so multi-key holders can't
+    deadlock.
+    """
+
+    def __init__(self, stripes: int = 256):
+        self._locks: List[asyncio.Lock] = [asyncio.Lock() for _ in range(stripes)]
+
+    def _stripe(self, key: Hashable) -> int:
+        return zlib.crc32(str(key).encode()) % len(self._locks)
+
+    @asynccontextmanager
+    async def hold(self, *keys: Hashable) -> AsyncIterator[None]:
+        """Hold the locks of every key; uncontended acquisition doesn't yield"""
+        async with self._hold_stripes(sorted({self._stripe(key) for key in keys})):
+            yield
+
+    @asynccontextmanager
+    async def hold_all(self) -> AsyncIterator[None]:
+        """Hold every stripe, waiting out all current holders and keeping new ones out"""
+        async with self._hold_stripes(range(len(self._locks))):
+            yield
+
+    @asynccontextmanager
+    async def _hold_stripes(self, stripes) -> AsyncIterator[None]:
+        acquired = []
+        try:
+            for stripe in stripes:
+                await self._locks[stripe].acquire()
+                acquired.append(self._locks[stripe])
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
@@ -0,0 +1,21 @@
+from decimal import ROUND_HALF_EVEN, Decimal
+from typing import Union
+
+# Balances are integer micro-USD; dollars only appear at the Discord and API edges
+MICROS_PER_USD = 1_000_000
+
+
+def to_micros(usd: Union[float, int, str, Decimal]) -> int:
+    """Dollars to micro-USD, rounding half to even at the sixth decimal.
+
+    Floats go through their shortest repr, so an amount typed as 12.34 is
+    exactly 12_340_000 rather than whatever its binary value rounds to.
+    """
+    if isinstance(usd, float):
+        usd = repr(usd)
+    return int((Decimal(usd) * MICROS_PER_USD).to_integral_value(rounding=ROUND_HALF_EVEN))
+
+
+def to_usd(micros: int) -> float:
+    """Micro-USD to dollars, for display and external APIs"""
+    return micros / MICROS_PER_USD
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_USER = "Unknown User"
+
+
+class NameResolver:
+    """Display names for user ids with as few REST calls as possible.
+
+    Lookups go to an LRU/TTL cache first, then the gateway member and user
+    caches; only the remaining misses are fetched, concurrently but bounded
+    by a semaphore, with one request per id even under concurrent lookups.
+    """
+
+    def __init__(self, client: discord.Client, max_concurrency: int = 5, cache_size: int = 10_000,
+                 ttl: float = 3600.0):
+        self._client = client
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._cache_size = cache_size
+        self._ttl = ttl
+        self._cache: "OrderedDict[int, Tuple[str, float]]" = OrderedDict()
+        self._inflight: Dict[int, asyncio.Task] = {}
+
+    def _cached(self, user_id: int) -> Optional[str]:
+        entry = self._cache.get(user_id)
+        if entry is None:
+            return None
+        name, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._cache[user_id]
+            return None
+        self._cache.move_to_end(user_id)
+        return name
+
+    def _store(self, user_id: int, name: str) -> None:
+        self._cache[user_id] = (name, time.monotonic() + self._ttl)
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    def _from_gateway(self, user_id: int, guild: Optional[discord.Guild]) -> Optional[str]:
+        member = guild.get_member(user_id) if guild else None
+        user = member or self._client.get_user(user_id)
+        return user.display_name if user else None
+
+    async def _fetch(self, user_id: int) -> str:
+        async with self._semaphore:
+            try:
+                user = await self._client.fetch_user(user_id)
+            except discord.HTTPException as e:
+                logger.warning(f"Could not fetch user {user_id}: {e}")
+                return UNKNOWN_USER  # Not cached, retried on the next lookup
+        self._store(user_id, user.display_name)
+        return user.display_name
+
+    async def resolve(self, user_ids: Iterable, guild: Optional[discord.Guild] = None) -> Dict[int, str]:
+        """Map each user id to a display name, fetching cache misses concurrently"""
+        names: Dict[int, str] = {}
+        misses = []
+        for user_id in dict.fromkeys(map(int, user_ids)):
+            # A hit only moves to the LRU end; its expiry stays, so renames show up within the TTL
+            name = self._cached(user_id)
+            if name is None:
+                name = self._from_gateway(user_id, guild)
+                if name:
+                    self._store(user_id, name)
+            if name:
+                names[user_id] = name
+            else:
+                misses.append(user_id)
+
+        tasks = []
+        for user_id in misses:
+            task = self._inflight.get(user_id)
+            if task is None:
+                task = asyncio.create_task(self._fetch(user_id))
+                self._inflight[user_id] = task
+                task.add_done_callback(lambda _, user_id=user_id: self._inflight.pop(user_id, None))
+            tasks.append(task)
+        for user_id, name in zip(misses, await asyncio.gather(*tasks)):
+            names[user_id] = name
+        return names
+
+    async def name(self, user_id, guild: Optional[discord.Guild] = None) -> str:
+        return (await self.resolve([user_id], guild))[int(user_id)]
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+import discord
+
+from core.names import NameResolver
+from core.outbound import NORMAL, Outbox
+from core.prices import CURRENCY_MAP
+from core.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+MAX_FIELDS = 25  # Discord's limit per embed
+MAX_PER_MESSAGE = 50  # Deposits per post, well under Discord's 6000-character total per message
+
+
+class DepositNotifier:
+    """Outbound deposit notifications, kept off the crediting path.
+
+    Callers enqueue and return at once. DMs are sent by one worker under a
+    token bucket for the DM route; deposit-channel announcements are
+    buffered and posted every flush_interval seconds as one message, with a
+    field per deposit, so a burst of confirmations costs a few posts.
+    """
+
+    def __init__(self, client: discord.Client, names: NameResolver, outbox: Outbox, to_usd: Callable[[float, str], Awaitable[float]],
+                 channel_id: Optional[int], flush_interval: float = 5.0, dm_rate: float = 1.0, dm_burst: int = 5,
+                 queue_size: int = 1000):
+        self._client = client
+        self._names = names
+        self._outbox = outbox
+        self._to_usd = to_usd
+        self._channel_id = channel_id
+        self._flush_interval = flush_interval
+        self._dm_bucket = TokenBucket(dm_rate, dm_burst)
+        self._dms: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._announcements: List[Tuple[str, float, str]] = []  # (user_id, value_usd, currency)
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._dm_loop()), asyncio.create_task(self._flush_loop())]
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        if self._dms.qsize():
+            logger.warning(f"Dropping {self._dms.qsize()} queued deposit DMs on shutdown")
+        await self.flush()
+
+    # -----------------------------------------
+    # Enqueue
+    # -----------------------------------------
+    def _queue_dm(self, dm: Tuple) -> None:
+        try:
+            self._dms.put_nowait(dm)
+        except asyncio.QueueFull:
+            logger.warning(f"DM queue full, dropping deposit DM for user {dm[0]}")
+
+    def deposit_pending(self, user_id: str, tx_hash: str, value: float, currency: str) -> None:
+        """DM the user about an unconfirmed deposit; value is in the currency's base units"""
+        self._queue_dm((user_id, tx_hash, 0, value, None, currency))
+
+    def deposit_confirmed(self, user_id: str, tx_hash: str, value_usd: float, currency: str) -> None:
+        """DM the user and announce a credited deposit in the deposit channel"""
+        self._queue_dm((user_id, tx_hash, 1, None, value_usd, currency))
+        self._announcements.append((user_id, value_usd, currency))
+
+    # -----------------------------------------
+    # DMs
+    # -----------------------------------------
+    async def _dm_loop(self) -> None:
+        while True:
+            user_id, tx_hash, confirmations, value, value_usd, currency = await self._dms.get()
+            try:
+                user = self._client.get_user(int(user_id))
+                if not user:
+                    continue
+                if value_usd is None:
+                    value_usd = await self._to_usd(value, currency)
+                await self._dm_bucket.take()
+                await self._outbox.send(user, NORMAL, embed=self._dm_embed(tx_hash, confirmations, value_usd, currency))
+            except Exception as e:
+                logger.error(f"Error sending DM to user {user_id}: {e}")
+
+    @staticmethod
+    def _dm_embed(tx_hash: str, confirmations: int, value_usd: float, currency: str) -> discord.Embed:
+        blockchain_url = f"https://blockchair.com/{CURRENCY_MAP[currency]}/transaction/{tx_hash}"
+        if confirmations == 0:
+            embed = discord.Embed(
+                title="Pending Deposit",
+                description=f"We have detected a pending deposit from your {currency.upper()} address.",
+                color=discord.Color.orange()
+            )
+            embed.add_field(name="Amount", value=f"${value_usd:.2f}", inline=True)
+            embed.add_field(name="Blockchain", value=f"[Click Here]({blockchain_url})", inline=True)
+            embed.add_field(name="Confirmations", value="0/1", inline=True)
+            embed.set_footer(text="This transaction will be automatically credited once confirmed.")
+        else:
+            embed = discord.Embed(
+                title="Transaction Confirmed",
+                description=f"Your {currency.upper()} deposit has been confirmed.",
+                color=discord.Color.green()
+            )
+            embed.add_field(name="Amount", value=f"${value_usd:.2f}", inline=True)
+            embed.add_field(name="Blockchain", value=f"[Click Here]({blockchain_url})", inline=True)
+            embed.add_field(name="Confirmations", value="1/1", inline=True)
+        return embed
+
+    # -----------------------------------------
+    # Deposit channel
+    # -----------------------------------------
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Post every buffered announcement, as few messages as the embed limits allow"""
+        if not self._announcements:
+            return
+        channel = self._client.get_channel(self._channel_id) if self._channel_id else None
+        if not channel:
+            logger.error(f"Deposit channel {self._channel_id} not found, dropping {len(self._announcements)} announcements")
+            self._announcements = []
+            return
+
+        while self._announcements:
+            batch, self._announcements = self._announcements[:MAX_PER_MESSAGE], self._announcements[MAX_PER_MESSAGE:]
+            try:
+                names = await self._names.resolve([user_id for user_id, _, _ in batch], channel.guild)
+                await self._outbox.send(channel, NORMAL, embeds=self._announcement_embeds(batch, names))
+            except Exception as e:
+                logger.error(f"Error notifying deposit channel: {e}")
+
+    @staticmethod
+    def _announcement_embeds(batch: List[Tuple[str, float, str]], names) -> List[discord.Embed]:
+        if len(batch) == 1:
+            user_id, value_usd, currency = batch[0]
+            user_name = names[int(user_id)]
+            embed = discord.Embed(
+                title="New Deposit Confirmed!",
+                description=f"A deposit has been confirmed for {user_name}.",
+                color=discord.Color.green()
+            )
+            embed.add_field(name="User", value=user_name, inline=True)
+            embed.add_field(name="Amount (USD)", value=f"${value_usd:.2f}", inline=True)
+            embed.add_field(name="Currency", value=currency.upper(), inline=True)
+            embed.set_footer(text="Deposit successfully credited.")
+            return [embed]
+
+        embeds = []
+        for start in range(0, len(batch), MAX_FIELDS):
+            chunk = batch[start:start + MAX_FIELDS]
+            embed = discord.Embed(
+                title="New Deposits Confirmed!",
+                description=f"{len(chunk)} deposits have been confirmed.",
+                color=discord.Color.green()
+            )
+            for user_id, value_usd, currency in chunk:
+                embed.add_field(name=names[int(user_id)], value=f"${value_usd:.2f} in {currency.upper()}", inline=True)
+            embed.set_footer(text="Deposits successfully credited.")
+            embeds.append(embed)
+        return embeds
@@ -0,0 +1,258 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+import discord
+
+from core.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Priorities, most urgent first
+INTERACTIVE = 0  # A user is waiting on this message
+NORMAL = 1  # Notifications and status updates
+COSMETIC = 2  # Edits that a later edit would supersede anyway
+
+
+class OutboundJob:
+    """One queued Discord call"""
+
+    __slots__ = ("priority", "seq", "route", "call", "kwargs", "merge_key", "future", "queued_at")
+
+    def __init__(self, priority: int, seq: int, route: Hashable, call: Callable[..., Awaitable],
+                 kwargs: Dict[str, Any], merge_key: Optional[Hashable]):
+        self.priority = priority
+        self.seq = seq
+        self.route = route
+        self.call = call
+        self.kwargs = kwargs
+        self.merge_key = merge_key
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.queued_at = time.monotonic()
+
+    def __lt__(self, other: "OutboundJob") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class Outbox:
+    """Central scheduler for messages and edits sent outside interaction responses.
+
+    Calls are queued by priority and dispatched under a token bucket per
+    channel and a global one, with one call in flight per channel so a
+    channel's messages keep their order. A queued edit to a message absorbs
+    later edits to it, so only the newest content is sent, and cosmetic
+    edits are dropped when the queue is full. Interaction responses don't
+    come through here: they have their own deadline and route.
+
+    Each route keeps its own heap. Routes that could send now sit in a
+    ready heap keyed by their most urgent call, and throttled routes in a
+    heap keyed by when their bucket next has a token, so picking the next
+    call never touches the queues of throttled or busy routes.
+    """
+
+    def __init__(self, channel_rate: float = 1.0, channel_burst: int = 5, global_rate: float = 45.0,
+                 global_burst: int = 45, queue_size: int = 5000, drain_timeout: float = 5.0):
+        self._channel_rate = channel_rate
+        self._channel_burst = channel_burst
+        self._global = TokenBucket(global_rate, global_burst)
+        self._queue_size = queue_size
+        self._drain_timeout = drain_timeout
+        self._routes: Dict[Hashable, List[OutboundJob]] = {}  # Queued calls per route, each a heap
+        self._queued = 0
+        self._ready: List[Tuple[int, int, Hashable]] = []  # (priority, seq) of a route's head; may be stale
+        self._throttled: List[Tuple[float, Hashable]] = []  # (time its bucket has a token, route)
+        self._waiting: Set[Hashable] = set()  # Routes in _throttled
+        self._merging: Dict[Hashable, OutboundJob] = {}  # Queued edits by message id
+        self._buckets: Dict[Hashable, TokenBucket] = {}
+        self._busy: Set[Hashable] = set()  # Routes with a call in flight
+        self._seq = itertools.count()
+        self._wake: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._wake = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    async def close(self) -> None:
+        """Give queued calls a chance to go out, then cancel the rest"""
+        deadline = time.monotonic() + self._drain_timeout
+        while (self._queued or self._busy) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+        if self._queued:
+            logger.warning(f"Dropping {self._queued} queued Discord calls on shutdown")
+        for jobs in self._routes.values():
+            for job in jobs:
+                job.future.cancel()
+        self._routes = {}
+        self._queued = 0
+        self._ready = []
+        self._throttled = []
+        self._waiting = set()
+        self._merging = {}
+
+    @property
+    def pending(self) -> int:
+        return self._queued
+
+    # -----------------------------------------
+    # Submission
+    # -----------------------------------------
+    @staticmethod
+    def _route(target) -> Hashable:
+        """The rate-limit bucket a target's messages count against"""
+        if isinstance(target, (discord.User, discord.Member)):
+            return ("dm", target.id)
+        channel = getattr(target, "channel", target)  # Messages and command contexts
+        return channel.id
+
+    def submit(self, route: Hashable, call: Callable[..., Awaitable], priority: int = NORMAL,
+               merge_key: Optional[Hashable] = None, **kwargs) -> asyncio.Future:
+        """Queue call(**kwargs); the returned future resolves to its result.
+
+        With merge_key, a call still queued under the same key takes the new
+        kwargs (and the more urgent priority) instead of queueing another.
+        Failures are logged, so the future doesn't need to be awaited.
+        """
+        job = self._merging.get(merge_key) if merge_key is not None else None
+        if job is not None:
+            job.kwargs.update(kwargs)
+            if priority < job.priority:
+                job.priority = priority
+                heapq.heapify(self._routes[job.route])
+                self._activate(job.route)
+                self._wake.set()
+            return job.future
+
+        job = OutboundJob(priority, next(self._seq), route, call, kwargs, merge_key)
+        job.future.add_done_callback(self._log_failure)
+        if priority == COSMETIC and self._queued >= self._queue_size:
+            logger.warning(f"Outbound queue full, dropping cosmetic update for {route}")
+            job.future.set_result(None)
+            return job.future
+        jobs = self._routes.setdefault(route, [])
+        heapq.heappush(jobs, job)
+        self._queued += 1
+        if merge_key is not None:
+            self._merging[merge_key] = job
+        if jobs[0] is job:
+            self._activate(route)
+            self._wake.set()
+        return job.future
+
+    @staticmethod
+    def _log_failure(future: asyncio.Future) -> None:
+        if not future.cancelled() and future.exception():
+            logger.warning(f"Outbound Discord call failed: {future.exception()}")
+
+    def send(self, target: discord.abc.Messageable, priority: int = NORMAL, **kwargs) -> asyncio.Future:
+        """Queue target.send(**kwargs)"""
+        return self.submit(self._route(target), target.send, priority, **kwargs)
+
+    def edit(self, message: discord.PartialMessage, priority: int = COSMETIC, **kwargs) -> asyncio.Future:
+        """Queue message.edit(**kwargs), merged with any edit of the message still queued"""
+        return self.submit(self._route(message), message.edit, priority, merge_key=("edit", message.id), **kwargs)
+
+    # -----------------------------------------
+    # Dispatch
+    # -----------------------------------------
+    def _bucket(self, route: Hashable) -> TokenBucket:
+        bucket = self._buckets.get(route)
+        if bucket is None:
+            if len(self._buckets) >= 10_000:
+                # Forget buckets that have refilled; they'd be recreated full anyway
+                self._buckets = {key: b for key, b in self._buckets.items() if b.delay(b.capacity) > 0}
+            bucket = self._buckets[route] = TokenBucket(self._channel_rate, self._channel_burst)
+        return bucket
+
+    def _activate(self, route: Hashable) -> None:
+        """Offer a route's most urgent call to the dispatcher, unless the route must wait anyway"""
+        jobs = self._routes.get(route)
+        if jobs and route not in self._busy and route not in self._waiting:
+            heapq.heappush(self._ready, (jobs[0].priority, jobs[0].seq, route))
+
+    def _head(self, route: Hashable) -> Optional[OutboundJob]:
+        """A route's most urgent call still wanted, dropping ones whose future is already done"""
+        jobs = self._routes.get(route)
+        while jobs and jobs[0].future.done():
+            heapq.heappop(jobs)
+            self._queued -= 1
+        if not jobs:
+            self._routes.pop(route, None)
+            return None
+        return jobs[0]
+
+    def _next_ready(self) -> Optional[float]:
+        """Start every call whose route has budget; returns the wait until the next one might"""
+        now = time.monotonic()
+        while self._throttled and self._throttled[0][0] <= now:
+            _, route = heapq.heappop(self._throttled)
+            self._waiting.discard(route)
+            self._activate(route)
+
+        wait = None
+        while self._ready:
+            delay = self._global.delay()
+            if delay > 0:
+                wait = delay
+                break
+            priority, seq, route = heapq.heappop(self._ready)
+            if route in self._busy or route in self._waiting:
+                continue  # Re-offered when the call in flight finishes or the bucket refills
+            job = self._head(route)
+            if job is None:
+                continue
+            if (job.priority, job.seq) != (priority, seq):
+                if (job.priority, job.seq) > (priority, seq):
+                    self._activate(route)  # The entry's call finished early; offer the next one
+                continue
+            bucket = self._bucket(route)
+            if not bucket.try_take():
+                heapq.heappush(self._throttled, (now + bucket.delay(), route))
+                self._waiting.add(route)
+                continue
+            self._global.try_take()
+            heapq.heappop(self._routes[route])
+            self._queued -= 1
+            if not self._routes[route]:
+                del self._routes[route]
+            if job.merge_key is not None:
+                self._merging.pop(job.merge_key, None)
+            self._busy.add(route)
+            asyncio.create_task(self._execute(job))
+
+        if self._throttled:
+            until = max(self._throttled[0][0] - time.monotonic(), 0.0)
+            wait = until if wait is None else min(wait, until)
+        return wait
+
+    async def _execute(self, job: OutboundJob) -> None:
+        try:
+            result = await job.call(**job.kwargs)
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            waited = time.monotonic() - job.queued_at
+            if waited > 10:
+                logger.info(f"Outbound call for {job.route} waited {waited:.1f}s (priority {job.priority})")
+            self._busy.discard(job.route)
+            self._activate(job.route)
+            self._wake.set()
+
+    async def _dispatch_loop(self) -> None:
+        while True:
+            self._wake.clear()
+            wait = self._next_ready()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
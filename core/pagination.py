@@ -0,0 +1,73 @@
+import logging
+from typing import Callable, Tuple
+
+import discord
+
+from core.history import HistoryPage, HistoryStore
+
+logger = logging.getLogger(__name__)
+
+# render(page, (count, total), page_number) -> embed for that page
+PageRenderer = Callable[[HistoryPage, Tuple[int, float], int], discord.Embed]
+
+
+class HistoryView(discord.ui.View):
+    """Newer/Older buttons over a user's history, one page fetched per click.
+
+    Only the cursors of the page on screen are kept; each click fetches the
+    adjacent page by keyset, so paging cost doesn't grow with the history.
+    """
+
+    def __init__(self, history: HistoryStore, kind: str, user_id: int, render: PageRenderer,
+                 page_size: int = 10, timeout: float = 300):
+        super().__init__(timeout=timeout)
+        self.history = history
+        self.kind = kind
+        self.user_id = user_id
+        self.render = render
+        self.page_size = page_size
+        self.page = None
+        self.page_number = 1
+        self.message = None
+
+    async def load(self, before=None, after=None, page_number: int = 1) -> discord.Embed:
+        """Fetch a page, update the buttons and render it"""
+        self.page = await self.history.page(self.kind, self.user_id, self.page_size, before=before, after=after)
+        summary = await self.history.summary(self.kind, self.user_id)
+        # Paging newer from the top of a grown history: restart the numbering
+        self.page_number = page_number if self.page.has_newer else 1
+        self.newer.disabled = not self.page.has_newer
+        self.older.disabled = not self.page.has_older
+        return self.render(self.page, summary, self.page_number)
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.user_id:
+            await interaction.response.send_message("❌ Only the person who ran this command can change pages.", ephemeral=True)
+            return False
+        return True
+
+    async def _turn(self, interaction: discord.Interaction, step: int) -> None:
+        try:
+            if step < 0:
+                embed = await self.load(after=self.page.first_id, page_number=self.page_number - 1)
+            else:
+                embed = await self.load(before=self.page.last_id, page_number=self.page_number + 1)
+            await interaction.response.edit_message(embed=embed, view=self)
+        except Exception as e:
+            logger.error(f"Error paging {self.kind} history: {e}")
+            await interaction.response.send_message("❌ Couldn't load that page, please try again.", ephemeral=True)
+
+    @discord.ui.button(label="◀ Newer", style=discord.ButtonStyle.secondary)
+    async def newer(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._turn(interaction, -1)
+
+    @discord.ui.button(label="Older ▶", style=discord.ButtonStyle.secondary)
+    async def older(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._turn(interaction, 1)
+
+    async def on_timeout(self):
+        if self.message:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass
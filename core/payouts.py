@@ -0,0 +1,272 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from core.http import HttpClient
+from core.prices import PriceOracle
+from core.withdrawals import WithdrawalRegistry
+
+logger = logging.getLogger(__name__)
+
+APIRONE_ACCOUNT_URL = "https://apirone.com/api/v2/accounts/{account}"
+
+# Smallest on-chain unit per currency
+CURRENCY_UNITS = {
+    "btc": 10**8,
+    "ltc": 10**8,
+    "eth": 10**18,
+    "usdt@trx": 10**6
+}
+
+
+class PayoutError(Exception):
+    """A withdrawal that could not be sent"""
+
+
+class WithdrawalJob:
+    """One admin-approved withdrawal moving through the pipeline"""
+
+    def __init__(self, user_id: str, currency: str, amount: float, address: str,
+                 request_id: int, user_channel_id: int, admin_channel_id: Optional[int] = None):
+        self.user_id = user_id
+        self.currency = currency
+        self.amount = amount  # USD
+        self.address = address
+        self.request_id = request_id
+        self.user_channel_id = user_channel_id
+        self.admin_channel_id = admin_channel_id
+        self.units = 0  # Amount in the currency's smallest unit, set by the quote stage
+        self.tx_hash: Optional[str] = None
+        self.queued_at = time.monotonic()
+
+
+class PayoutPipeline:
+    """Queued Apirone payout pipeline with bounded concurrency.
+
+    Each job goes through rate quote -> balance check -> transfer -> log ->
+    notify on one of a fixed number of workers. The Apirone account balance is
+    cached and debited locally as transfers go out, so most jobs skip the
+    balance request entirely.
+
+    With a batch_window, jobs for the same currency are collected for that
+    many seconds (or until batch_max jobs) and sent as one multi-destination
+    transfer, sharing a single network fee and txid.
+    """
+
+    def __init__(self, http: HttpClient, prices: PriceOracle, registry: WithdrawalRegistry,
+                 account: str, transfer_key: str,
+                 on_sent: Callable[[WithdrawalJob], Awaitable[None]],
+                 on_failed: Callable[[WithdrawalJob, str], Awaitable[None]],
+                 workers: int = 2, queue_size: int = 100, balance_ttl: float = 60.0,
+                 batch_window: float = 0.0, batch_max: int = 50):
+        self._http = http
+        self._prices = prices
+        self._registry = registry
+        self._account = account
+        self._transfer_key = transfer_key
+        self._on_sent = on_sent
+        self._on_failed = on_failed
+        self._worker_count = workers
+        self._queue_size = queue_size  # Bounds queued, batched and ready jobs together
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._ready: asyncio.Queue = asyncio.Queue()  # Batches ready to send
+        self._ready_jobs = 0
+        self._workers: List[asyncio.Task] = []
+        self._batch_window = batch_window
+        self._batch_max = batch_max
+        self._batches: Dict[str, List[WithdrawalJob]] = {}
+        self._batch_timers: Dict[str, asyncio.TimerHandle] = {}
+        self._balance_ttl = balance_ttl
+        self._balances: Dict[str, int] = {}
+        self._balances_at = 0.0
+        self._balance_lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self._worker_count)]
+        self._workers.append(asyncio.create_task(self._collect()))
+
+    async def close(self) -> None:
+        for timer in self._batch_timers.values():
+            timer.cancel()
+        self._batch_timers.clear()
+        if self.pending:
+            logger.warning(f"Payout pipeline closed with {self.pending} withdrawal(s) not sent")
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, job: WithdrawalJob) -> None:
+        """Queue a job; raises asyncio.QueueFull when the pipeline is saturated"""
+        # The collector drains _queue into batches right away, so count every stage
+        if self.pending >= self._queue_size:
+            raise asyncio.QueueFull
+        self._queue.put_nowait(job)
+
+    @property
+    def pending(self) -> int:
+        batched = sum(len(batch) for batch in self._batches.values())
+        return self._queue.qsize() + batched + self._ready_jobs
+
+    # -----------------------------------------
+    # Batching
+    # -----------------------------------------
+    async def _collect(self) -> None:
+        """Group queued jobs per currency and hand finished batches to the workers"""
+        while True:
+            job = await self._queue.get()
+            self._queue.task_done()
+            if self._batch_window <= 0:
+                self._enqueue([job])
+                continue
+
+            batch = self._batches.setdefault(job.currency, [])
+            batch.append(job)
+            if len(batch) >= self._batch_max:
+                self._flush(job.currency)
+            elif len(batch) == 1:
+                loop = asyncio.get_running_loop()
+                self._batch_timers[job.currency] = loop.call_later(self._batch_window, self._flush, job.currency)
+
+    def _flush(self, currency: str) -> None:
+        timer = self._batch_timers.pop(currency, None)
+        if timer:
+            timer.cancel()
+        batch = self._batches.pop(currency, None)
+        if batch:
+            self._enqueue(batch)
+
+    def _enqueue(self, batch: List[WithdrawalJob]) -> None:
+        self._ready_jobs += len(batch)
+        self._ready.put_nowait(batch)
+
+    async def _worker(self) -> None:
+        while True:
+            batch = await self._ready.get()
+            self._ready_jobs -= len(batch)
+            try:
+                await self._process(batch)
+            except Exception as e:
+                logger.error(f"Unexpected error in payout worker: {e}")
+            finally:
+                self._ready.task_done()
+
+    async def _fail(self, job: WithdrawalJob, error: Exception) -> None:
+        if isinstance(error, PayoutError):
+            reason = str(error)
+        else:
+            logger.error(f"Unexpected error during withdrawal for user {job.user_id}: {error}")
+            reason = "Withdrawal failed due to an unexpected error. Please contact support."
+        try:
+            await self._on_failed(job, reason)
+        except Exception as e:
+            logger.error(f"Error reporting failed withdrawal for user {job.user_id}: {e}")
+
+    async def _process(self, batch: List[WithdrawalJob]) -> None:
+        """Send one batch of same-currency jobs as a single transfer"""
+        jobs = []
+        for job in batch:
+            try:
+                await self._quote(job)
+                await self._reserve(job)
+            except Exception as e:
+                await self._fail(job, e)
+            else:
+                jobs.append(job)
+        if not jobs:
+            return
+
+        try:
+            tx_hash = await self._transfer(jobs)
+        except Exception as e:
+            for job in jobs:
+                await self._release(job)
+                await self._fail(job, e)
+            return
+
+        # Fan the shared txid out to every withdrawal in the batch
+        for job in jobs:
+            job.tx_hash = tx_hash
+            try:
+                await self._log(job)
+            except Exception as e:
+                # The funds are already gone; still tell the user
+                logger.error(f"Error logging withdrawal {job.tx_hash} for user {job.user_id}: {e}")
+            try:
+                await self._on_sent(job)
+            except Exception as e:
+                logger.error(f"Error reporting sent withdrawal {job.tx_hash} for user {job.user_id}: {e}")
+
+    # -----------------------------------------
+    # Stages
+    # -----------------------------------------
+    async def _quote(self, job: WithdrawalJob) -> None:
+        exchange_rate = await self._prices.get_price(job.currency, max_age=120)
+        if not exchange_rate:
+            raise PayoutError(f"Failed to fetch exchange rate for {job.currency.upper()}. Please try again later.")
+        unit = CURRENCY_UNITS.get(job.currency, 1)
+        job.units = int(job.amount / exchange_rate * unit)
+
+    async def _fetch_balances(self) -> None:
+        url = f"{APIRONE_ACCOUNT_URL.format(account=self._account)}/balance"
+        response = await self._http.get(url, "apirone.balance")
+        if response.status != 200:
+            raise PayoutError(f"Failed to retrieve account balance. Status Code: {response.status}, Response: {response.text}")
+        self._balances = {item["currency"]: item["available"] for item in response.json().get("balance", [])}
+        self._balances_at = time.monotonic()
+
+    async def _reserve(self, job: WithdrawalJob) -> None:
+        """Check the cached account balance and debit the job from it"""
+        async with self._balance_lock:
+            if time.monotonic() - self._balances_at > self._balance_ttl:
+                await self._fetch_balances()
+            if self._balances.get(job.currency, 0) < job.units:
+                # The cache may be behind incoming funds; confirm with Apirone before refusing
+                await self._fetch_balances()
+            available = self._balances.get(job.currency, 0)
+            if available < job.units:
+                unit = CURRENCY_UNITS.get(job.currency, 1)
+                raise PayoutError(
+                    f"Not enough funds. Available: {available / unit:.8f} {job.currency.upper()}, "
+                    f"Requested: {job.units / unit:.8f} {job.currency.upper()}"
+                )
+            self._balances[job.currency] = available - job.units
+
+    async def _release(self, job: WithdrawalJob) -> None:
+        async with self._balance_lock:
+            self._balances[job.currency] = self._balances.get(job.currency, 0) + job.units
+
+    async def _transfer(self, jobs: List[WithdrawalJob]) -> str:
+        # One destination per address; repeated addresses in a batch are merged
+        amounts: Dict[str, int] = {}
+        for job in jobs:
+            amounts[job.address] = amounts.get(job.address, 0) + job.units
+
+        url = f"{APIRONE_ACCOUNT_URL.format(account=self._account)}/transfer"
+        payload = {
+            "currency": jobs[0].currency,
+            "transfer-key": self._transfer_key,
+            "destinations": [{"address": address, "amount": units} for address, units in amounts.items()],
+            "fee": "normal",
+            "subtract-fee-from-amount": True
+        }
+        response = await self._http.post(url, "apirone.transfer", json=payload)
+        if response.status != 200 or not response.body:
+            raise PayoutError(f"Withdrawal failed. Status Code: {response.status}, Response: {response.text}")
+
+        response_data = response.json()
+        logger.info(f"Apirone transfer response for {len(jobs)} withdrawal(s): {response_data}")
+        txs = response_data.get("txs")
+        return txs[0] if isinstance(txs, list) and txs else "N/A"
+
+    async def _log(self, job: WithdrawalJob) -> None:
+        await self._registry.record(job.user_id, {
+            "currency": job.currency,
+            "amount": job.amount,
+            "address": job.address,
+            "tx_hash": job.tx_hash,
+            "timestamp": int(time.time()),
+            "channel_id": job.user_channel_id,
+            "message_id": job.request_id
+        })
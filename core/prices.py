@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+from core.http import HttpClient
+
+logger = logging.getLogger(__name__)
+
+# Currency code -> CoinGecko id
+CURRENCY_MAP = {
+    "btc": "bitcoin",
+    "ltc": "litecoin",
+    "eth": "ethereum",
+    "usdt@trx": "tether"
+}
+
+COINGECKO_URL = "https://api.coingecko.com/api/v3/simple/price"
+
+
+class PriceOracle:
+    """USD prices for every supported currency from one batched CoinGecko call.
+
+    Concurrent lookups share a single in-flight request, a background task
+    refreshes prices shortly before they expire, and when CoinGecko fails the
+    last good price keeps being served until it is max_staleness seconds old.
+    """
+
+    def __init__(self, http: HttpClient, currency_map: Dict[str, str] = CURRENCY_MAP, ttl: float = 60.0,
+                 refresh_ahead: float = 10.0, max_staleness: float = 900.0, timeout: float = 10.0):
+        self._http = http
+        self._currency_map = currency_map
+        self._ttl = ttl
+        self._refresh_ahead = refresh_ahead
+        self._max_staleness = max_staleness
+        self._timeout = timeout
+        self._prices: Dict[str, float] = {}
+        self._fetched_at = 0.0
+        self._failed_at = 0.0
+        self._retry_backoff = 10.0
+        self._inflight: Optional[asyncio.Task] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def close(self) -> None:
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+
+    async def _fetch(self) -> None:
+        ids = ",".join(sorted(set(self._currency_map.values())))
+        params = {"ids": ids, "vs_currencies": "usd"}
+        response = await self._http.get(COINGECKO_URL, "coingecko.price", params=params, timeout=self._timeout)
+        if not response.ok:
+            raise ValueError(f"CoinGecko returned {response.status}")
+        data = response.json()
+
+        prices = {}
+        for currency, crypto_name in self._currency_map.items():
+            usd = data.get(crypto_name, {}).get("usd")
+            if usd:
+                prices[currency] = float(usd)
+        if not prices:
+            raise ValueError(f"No prices in CoinGecko response: {data}")
+        self._prices.update(prices)
+        self._fetched_at = time.monotonic()
+        self._failed_at = 0.0
+
+    async def refresh(self) -> bool:
+        """Fetch fresh prices, joining any request already in flight"""
+        if self._inflight is None or self._inflight.done():
+            if time.monotonic() - self._failed_at < self._retry_backoff:
+                return False  # Don't hammer CoinGecko right after a failure
+            self._inflight = asyncio.create_task(self._fetch())
+        try:
+            await asyncio.shield(self._inflight)
+            return True
+        except Exception as e:
+            self._failed_at = time.monotonic()
+            logger.error(f"Error fetching prices from CoinGecko: {e}")
+            return False
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            if self._fetched_at:
+                delay = self._fetched_at + self._ttl - self._refresh_ahead - time.monotonic()
+            else:
+                delay = 0
+            await asyncio.sleep(max(delay, self._retry_backoff if self._failed_at else 1.0))
+            await self.refresh()
+
+    async def get_price(self, currency: str, max_age: Optional[float] = None) -> Optional[float]:
+        """USD price for a currency, or None if no price within the staleness bound.
+
+        max_age tightens the staleness bound for callers that move real funds.
+        """
+        if currency not in self._currency_map:
+            logger.warning(f"Unknown currency: {currency}")
+            return None
+
+        age = time.monotonic() - self._fetched_at
+        if currency not in self._prices or age > self._ttl:
+            await self.refresh()
+            age = time.monotonic() - self._fetched_at
+
+        if currency in self._prices and age <= (max_age if max_age is not None else self._max_staleness):
+            return self._prices[currency]
+        return None
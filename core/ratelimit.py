@@ -0,0 +1,37 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """Token bucket refilled at rate tokens per second, holding at most capacity"""
+
+    __slots__ = ("rate", "capacity", "_tokens", "_updated_at")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def try_take(self, tokens: float = 1.0) -> bool:
+        """Take tokens if available, without waiting"""
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    def delay(self, tokens: float = 1.0) -> float:
+        """Seconds until tokens are available (0 if they are now)"""
+        self._refill()
+        return max(tokens - self._tokens, 0.0) / self.rate
+
+    async def take(self, tokens: float = 1.0) -> None:
+        """Wait until tokens are available and take them"""
+        while not self.try_take(tokens):
+            await asyncio.sleep(self.delay(tokens))
@@ -0,0 +1,91 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Awaitable, Callable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class Timer:
+    """A scheduled callback; cancel() drops it without touching the heap"""
+
+    __slots__ = ("when", "order", "callback", "cancelled")
+
+    def __init__(self, when: float, order: int, callback: Callable[[], Awaitable[None]]):
+        self.when = when
+        self.order = order
+        self.callback = callback
+        self.cancelled = False
+
+    def __lt__(self, other: "Timer") -> bool:
+        return (self.when, self.order) < (other.when, other.order)
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+
+class Scheduler:
+    """Bot-wide deadline scheduler driven by a single task.
+
+    Timers sit in a heap keyed by wall-clock deadline; one task sleeps until
+    the earliest one is due and runs its callback in its own task, so a slow
+    callback never delays the others.
+    """
+
+    def __init__(self):
+        self._heap: List[Timer] = []
+        self._counter = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+
+    async def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        tasks = list(self._running)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def call_at(self, when: float, callback: Callable[[], Awaitable[None]]) -> Timer:
+        """Run callback() at the given epoch time"""
+        timer = Timer(when, next(self._counter), callback)
+        heapq.heappush(self._heap, timer)
+        if self._wakeup and self._heap[0] is timer:
+            self._wakeup.set()  # New earliest deadline
+        return timer
+
+    @property
+    def pending(self) -> int:
+        return sum(not timer.cancelled for timer in self._heap)
+
+    async def _run(self) -> None:
+        while True:
+            while self._heap and self._heap[0].cancelled:
+                heapq.heappop(self._heap)
+            delay = self._heap[0].when - time.time() if self._heap else None
+            if delay is None or delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            timer = heapq.heappop(self._heap)
+            task = asyncio.create_task(self._fire(timer))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _fire(self, timer: Timer) -> None:
+        try:
+            await timer.callback()
+        except Exception as e:
+            logger.error(f"Error in scheduled callback: {e}")
@@ -0,0 +1,37 @@
+import asyncio
+import logging
+
+from core.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+
+class SequenceAllocator:
+    """Monotonic ID allocator that reserves IDs from storage in blocks.
+
+    Only the high-water mark is persisted, once per block_size IDs; IDs are
+    handed out from memory in between. After a restart allocation resumes
+    above the last reserved block, so IDs are never reused (the unused rest
+    of that block is skipped).
+    """
+
+    def __init__(self, storage: Storage, name: str, block_size: int = 1000, start: int = 1):
+        self._storage = storage
+        self._name = name
+        self._block_size = block_size
+        self._start = start
+        self._next = 0
+        self._limit = 0  # First ID past the reserved block
+        self._lock = asyncio.Lock()
+
+    async def next(self) -> int:
+        """Allocate the next ID; only touches storage when the block runs out"""
+        while self._next >= self._limit:
+            async with self._lock:
+                if self._next >= self._limit:
+                    first = await self._storage.reserve_counter(self._name, self._block_size, self._start)
+                    self._next, self._limit = first, first + self._block_size
+                    logger.info(f"Reserved {self._name} IDs {first}-{self._limit - 1}")
+        value = self._next
+        self._next += 1
+        return value
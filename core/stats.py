@@ -0,0 +1,143 @@
+import asyncio
+import heapq
+import logging
+from typing import Dict, List, Optional, Set, Tuple
+
+from core.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+# Stat names
+WAGERED = "wagered"
+DEPOSITED = "deposited"
+STATS = (WAGERED, DEPOSITED)
+
+
+class TopK:
+    """The k largest totals of a stat, kept exact under increments.
+
+    Totals only grow, so a user outside the top k can only enter it on their
+    own update, which is checked against the current minimum.
+    """
+
+    __slots__ = ("k", "_scores", "_ranked")
+
+    def __init__(self, k: int):
+        self.k = k
+        self._scores: Dict[str, float] = {}
+        self._ranked: Optional[List[Tuple[str, float]]] = None  # Sorted cache
+
+    @classmethod
+    def build(cls, k: int, totals: Dict[str, float]) -> "TopK":
+        top = cls(k)
+        top._scores = dict(heapq.nlargest(k, totals.items(), key=lambda item: item[1]))
+        return top
+
+    def update(self, user_id: str, total: float) -> bool:
+        """Offer a user's new total; returns True if the top-k membership changed"""
+        if user_id in self._scores:
+            self._scores[user_id] = total
+            self._ranked = None
+            return False
+        if len(self._scores) < self.k:
+            self._scores[user_id] = total
+            self._ranked = None
+            return True
+        lowest = min(self._scores, key=self._scores.get)
+        if total <= self._scores[lowest]:
+            return False
+        del self._scores[lowest]
+        self._scores[user_id] = total
+        self._ranked = None
+        return True
+
+    def ranked(self) -> List[Tuple[str, float]]:
+        if self._ranked is None:
+            self._ranked = sorted(self._scores.items(), key=lambda item: item[1], reverse=True)
+        return self._ranked
+
+
+class StatsStore:
+    """Per-user wager and deposit totals with top-k rankings.
+
+    Totals are updated in memory as bets settle and deposits are recorded;
+    changed totals are written behind to storage every flush_interval seconds
+    and on shutdown. top_changed is set whenever a ranking's membership
+    changes, so renderers can refresh early.
+    """
+
+    def __init__(self, storage: Storage, top_k: int = 10, flush_interval: float = 60.0):
+        self._storage = storage
+        self._top_k = top_k
+        self._flush_interval = flush_interval
+        self._totals: Dict[str, Dict[str, float]] = {stat: {} for stat in STATS}
+        self._top: Dict[str, TopK] = {stat: TopK(top_k) for stat in STATS}
+        self._dirty: Set[Tuple[str, str]] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        self.top_changed = asyncio.Event()
+
+    async def start(self) -> None:
+        """Load the persisted totals and start the write-behind flusher"""
+        stored = await self._storage.load_stats()
+        for stat in STATS:
+            self._totals[stat].update(stored.get(stat, {}))
+
+        if not self._totals[DEPOSITED]:
+            # First start with stats: seed deposit totals from the deposit history
+            for user_id, total in (await self._storage.get_deposit_totals()).items():
+                self._totals[DEPOSITED][user_id] = total
+                self._dirty.add((DEPOSITED, user_id))
+
+        for stat in STATS:
+            self._top[stat] = TopK.build(self._top_k, self._totals[stat])
+        self._flush_task = asyncio.create_task(self._flush_loop())
+        logger.info(f"Stats loaded for {len(self._totals[WAGERED])} wagering and {len(self._totals[DEPOSITED])} depositing users")
+
+    async def close(self) -> None:
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Write changed totals to storage"""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        changes: Dict[str, Dict[str, float]] = {}
+        for stat, user_id in dirty:
+            changes.setdefault(stat, {})[user_id] = self._totals[stat][user_id]
+        try:
+            await self._storage.save_stats(changes)
+        except Exception as e:
+            self._dirty.update(dirty)
+            logger.error(f"Error saving stats: {e}")
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            await self.flush()
+
+    def add(self, stat: str, user_id, amount: float) -> bool:
+        """Increase a user's total; returns True if the stat's top-k membership changed"""
+        user_id = str(user_id)
+        total = self._totals[stat].get(user_id, 0.0) + amount
+        self._totals[stat][user_id] = total
+        self._dirty.add((stat, user_id))
+        changed = self._top[stat].update(user_id, total)
+        if changed:
+            self.top_changed.set()
+        return changed
+
+    def record_wager(self, user_id, amount: float) -> bool:
+        return self.add(WAGERED, user_id, amount)
+
+    def record_deposit(self, user_id, amount: float) -> bool:
+        return self.add(DEPOSITED, user_id, amount)
+
+    def total(self, stat: str, user_id) -> float:
+        return self._totals[stat].get(str(user_id), 0.0)
+
+    def top(self, stat: str, limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        """The highest (user_id, total) pairs for a stat, best first"""
+        return self._top[stat].ranked()[:limit]
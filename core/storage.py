@@ -0,0 +1,727 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from core.money import to_micros
+
+logger = logging.getLogger(__name__)
+
+# Legacy flat files, also the source for the one-shot SQLite import
+BALANCES_FILE = "balances.json"
+WALLETS_FILE = "wallets.json"
+DEPOSITS_FILE = "deposits.json"
+WITHDRAWALS_FILE = "withdrawals.json"
+GAME_NUMBER_FILE = "gameNumber.json"
+TICKET_STATUS_FILE = "ticket_status.json"
+COINFLIPS_FILE = "coinflips.json"
+STATS_FILE = "stats.json"
+PENDING_DEPOSITS_FILE = "pending_deposits.json"
+LEDGER_KEYS_FILE = "ledger_keys.jsonl"  # Append-only, one JSON string per line
+
+BALANCE_UNIT = "micros"  # Marks a balances.json snapshot holding integer micro-USD
+
+DEPOSIT_FIELDS = ("currency", "amount", "tx_hash", "timestamp")
+WITHDRAWAL_FIELDS = ("currency", "amount", "address", "tx_hash", "timestamp", "channel_id", "message_id")
+PENDING_DEPOSIT_FIELDS = ("key", "user_id", "value", "currency", "tx_hash", "input_address", "received_at")
+COINFLIP_FIELDS = ("game_number", "initiator_id", "amount", "side", "start_time", "opponent_id", "state",
+                   "resolve_at", "channel_id", "message_id", "win_probability")
+
+
+class Storage:
+    """Interface shared by the storage backends.
+
+    Every call runs on one dedicated thread so the asyncio loop never blocks on
+    disk I/O and the backend never sees concurrent access.
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage")
+
+    async def _run(self, fn: Callable, *args) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def open(self) -> None:
+        await self._run(self._open)
+
+    async def close(self) -> None:
+        await self._run(self._close)
+        self._executor.shutdown(wait=True)
+
+    def _open(self) -> None:
+        raise NotImplementedError
+
+    def _close(self) -> None:
+        pass
+
+    # Balances snapshot in micro-USD (the ledger journal holds everything newer than seq)
+    async def load_balances(self) -> Tuple[int, Dict[str, int]]:
+        return await self._run(self._load_balances)
+
+    async def save_balances(self, seq: int, changes: Dict[str, int], keys: Iterable[str] = ()) -> None:
+        """Persist the balances and idempotency keys that changed since the previous snapshot"""
+        await self._run(self._save_balances, seq, changes, list(keys))
+
+    async def load_ledger_keys(self) -> Set[str]:
+        """Idempotency keys of every ledger record folded into the snapshot"""
+        return await self._run(self._load_ledger_keys)
+
+    # Wallets
+    async def get_wallets(self, user_id: str) -> Dict[str, str]:
+        return await self._run(self._get_wallets, str(user_id))
+
+    async def set_wallet(self, user_id: str, currency: str, address: str) -> None:
+        await self._run(self._set_wallet, str(user_id), currency, address)
+
+    async def find_wallet(self, address: str) -> Optional[Tuple[str, str]]:
+        """Return (user_id, currency) owning a deposit address"""
+        return await self._run(self._find_wallet, address)
+
+    async def get_all_wallets(self) -> List[Tuple[str, str, str]]:
+        """Every (user_id, currency, address) row"""
+        return await self._run(self._get_all_wallets)
+
+    # Deposit / withdrawal history
+    async def add_deposit(self, user_id: str, record: Dict) -> None:
+        await self._run(self._add_record, "deposits", str(user_id), record)
+
+    async def get_deposits(self, user_id: str, limit: int = 20) -> List[Dict]:
+        """Most recent deposits for a user, oldest first"""
+        return await self._run(self._get_records, "deposits", str(user_id), limit)
+
+    async def get_deposit_totals(self) -> Dict[str, float]:
+        return await self._run(self._get_totals, "deposits")
+
+    async def get_history_page(self, table: str, user_id: str, limit: int,
+                               before: Optional[int] = None, after: Optional[int] = None) -> List[Dict]:
+        """Up to limit deposit/withdrawal records, newest first, each with its "id" cursor.
+
+        before returns records older than that id, after returns records newer
+        than it; with neither the newest records are returned.
+        """
+        return await self._run(self._get_history_page, table, str(user_id), limit, before, after)
+
+    async def get_history_summary(self, table: str, user_id: str) -> Tuple[int, float]:
+        """(record count, amount total) of a user's deposits or withdrawals"""
+        return await self._run(self._get_history_summary, table, str(user_id))
+
+    async def add_withdrawal(self, user_id: str, record: Dict) -> None:
+        await self._run(self._add_record, "withdrawals", str(user_id), record)
+
+    async def get_withdrawals(self, user_id: str, limit: int = 20) -> List[Dict]:
+        """Most recent withdrawals for a user, oldest first"""
+        return await self._run(self._get_records, "withdrawals", str(user_id), limit)
+
+    # Counters
+    async def increment_counter(self, name: str, start: int = 1) -> int:
+        """Return the counter's current value and advance it by one"""
+        return await self._run(self._increment_counter, name, start, 1)
+
+    async def reserve_counter(self, name: str, count: int, start: int = 1) -> int:
+        """Return the counter's current value and advance it by count, reserving a block"""
+        return await self._run(self._increment_counter, name, start, count)
+
+    # Open coinflip games
+    async def save_game(self, record: Dict) -> None:
+        """Insert or update an open game checkpoint"""
+        await self._run(self._save_game, record)
+
+    async def delete_games(self, game_numbers: List[int]) -> None:
+        await self._run(self._delete_games, list(game_numbers))
+
+    async def load_games(self) -> List[Dict]:
+        return await self._run(self._load_games)
+
+    # Confirmed deposits not yet credited
+    async def save_pending_deposit(self, record: Dict) -> None:
+        await self._run(self._save_pending_deposit, record)
+
+    async def delete_pending_deposit(self, key: str) -> None:
+        await self._run(self._delete_pending_deposit, key)
+
+    async def load_pending_deposits(self) -> List[Dict]:
+        return await self._run(self._load_pending_deposits)
+
+    # Aggregate stats (wager / deposit totals)
+    async def load_stats(self) -> Dict[str, Dict[str, float]]:
+        """Every persisted total as {stat: {user_id: total}}"""
+        return await self._run(self._load_stats)
+
+    async def save_stats(self, changes: Dict[str, Dict[str, float]]) -> None:
+        await self._run(self._save_stats, changes)
+
+    # Ticket status
+    async def get_ticket(self, user_id: str) -> Optional[str]:
+        return await self._run(self._get_ticket, str(user_id))
+
+    async def set_ticket(self, user_id: str, channel_name: str) -> None:
+        await self._run(self._set_ticket, str(user_id), channel_name)
+
+
+class JsonStorage(Storage):
+    """The original flat JSON files, kept in memory and rewritten on change"""
+
+    def __init__(self, directory: str = "."):
+        super().__init__()
+        self._directory = directory
+        self._data: Dict[str, Any] = {}
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self._directory, name)
+
+    def _read(self, name: str, default: Any) -> Any:
+        try:
+            with open(self._path(name), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return default
+        except json.JSONDecodeError as e:
+            logger.error(f"Error decoding {name}: {e}")
+            return default
+
+    def _write(self, name: str, indent: Optional[int] = 4) -> None:
+        tmp_path = self._path(f"{name}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self._data[name], f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._path(name))
+
+    def _open(self) -> None:
+        for name in (WALLETS_FILE, DEPOSITS_FILE, WITHDRAWALS_FILE, TICKET_STATUS_FILE, COINFLIPS_FILE, STATS_FILE,
+                     PENDING_DEPOSITS_FILE):
+            self._data[name] = self._read(name, {})
+        self._data[GAME_NUMBER_FILE] = self._read(GAME_NUMBER_FILE, {"coinflip": 1})
+
+    def _load_balances(self) -> Tuple[int, Dict[str, int]]:
+        seq, balances = load_balances_file(self._path(BALANCES_FILE))
+        self._data[BALANCES_FILE] = {"seq": seq, "unit": BALANCE_UNIT, "balances": balances}
+        legacy_keys = self._read(BALANCES_FILE, {}).get("keys")
+        if legacy_keys:
+            # Keys used to be rewritten with every snapshot; move them to the append-only file once
+            self._append_keys(legacy_keys)
+            self._write(BALANCES_FILE, indent=None)
+        return seq, dict(balances)
+
+    def _save_balances(self, seq: int, changes: Dict[str, int], keys: List[str] = ()) -> None:
+        # Keys first: once the snapshot is written, the journal records carrying them are dropped
+        self._append_keys(keys)
+        snapshot = self._data.setdefault(BALANCES_FILE, {"seq": 0, "unit": BALANCE_UNIT, "balances": {}})
+        snapshot["seq"] = seq
+        snapshot["balances"].update(changes)
+        self._write(BALANCES_FILE, indent=None)
+
+    def _append_keys(self, keys: List[str]) -> None:
+        if not keys:
+            return
+        with open(self._path(LEDGER_KEYS_FILE), "ab") as f:
+            f.write("".join(json.dumps(key) + "\n" for key in keys).encode())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _load_ledger_keys(self) -> Set[str]:
+        return read_keys_file(self._path(LEDGER_KEYS_FILE), repair=True)
+
+    def _get_wallets(self, user_id: str) -> Dict[str, str]:
+        return dict(self._data[WALLETS_FILE].get(user_id, {}))
+
+    def _set_wallet(self, user_id: str, currency: str, address: str) -> None:
+        self._data[WALLETS_FILE].setdefault(user_id, {})[currency] = address
+        self._write(WALLETS_FILE)
+
+    def _find_wallet(self, address: str) -> Optional[Tuple[str, str]]:
+        for user_id, user_wallets in self._data[WALLETS_FILE].items():
+            for currency, wallet_address in user_wallets.items():
+                if wallet_address == address:
+                    return user_id, currency
+        return None
+
+    def _get_all_wallets(self) -> List[Tuple[str, str, str]]:
+        return [
+            (user_id, currency, address)
+            for user_id, user_wallets in self._data[WALLETS_FILE].items()
+            for currency, address in user_wallets.items()
+        ]
+
+    def _add_record(self, table: str, user_id: str, record: Dict) -> None:
+        name = DEPOSITS_FILE if table == "deposits" else WITHDRAWALS_FILE
+        self._data[name].setdefault(user_id, []).append({key: value for key, value in record.items() if value is not None})
+        self._write(name)
+
+    def _get_records(self, table: str, user_id: str, limit: int) -> List[Dict]:
+        name = DEPOSITS_FILE if table == "deposits" else WITHDRAWALS_FILE
+        return list(self._data[name].get(user_id, [])[-limit:])
+
+    def _get_history_page(self, table: str, user_id: str, limit: int,
+                          before: Optional[int], after: Optional[int]) -> List[Dict]:
+        # Records are append-only, so a record's list index is its cursor
+        name = DEPOSITS_FILE if table == "deposits" else WITHDRAWALS_FILE
+        records = self._data[name].get(user_id, [])
+        if after is not None:
+            ids = range(after + 1, min(after + 1 + limit, len(records)))[::-1]
+        else:
+            end = len(records) if before is None else min(before, len(records))
+            ids = range(end - 1, max(end - 1 - limit, -1), -1)
+        return [dict(records[i], id=i) for i in ids]
+
+    def _get_history_summary(self, table: str, user_id: str) -> Tuple[int, float]:
+        name = DEPOSITS_FILE if table == "deposits" else WITHDRAWALS_FILE
+        records = self._data[name].get(user_id, [])
+        return len(records), sum(record.get("amount", 0.0) for record in records)
+
+    def _get_totals(self, table: str) -> Dict[str, float]:
+        name = DEPOSITS_FILE if table == "deposits" else WITHDRAWALS_FILE
+        return {
+            user_id: sum(record.get("amount", 0.0) for record in records)
+            for user_id, records in self._data[name].items()
+        }
+
+    def _increment_counter(self, name: str, start: int, count: int) -> int:
+        value = self._data[GAME_NUMBER_FILE].get(name, start)
+        self._data[GAME_NUMBER_FILE][name] = value + count
+        self._write(GAME_NUMBER_FILE)
+        return value
+
+    def _save_game(self, record: Dict) -> None:
+        self._data[COINFLIPS_FILE][str(record["game_number"])] = dict(record)
+        self._write(COINFLIPS_FILE)
+
+    def _delete_games(self, game_numbers: List[int]) -> None:
+        for game_number in game_numbers:
+            self._data[COINFLIPS_FILE].pop(str(game_number), None)
+        self._write(COINFLIPS_FILE)
+
+    def _load_games(self) -> List[Dict]:
+        return [dict(record) for record in self._data[COINFLIPS_FILE].values()]
+
+    def _save_pending_deposit(self, record: Dict) -> None:
+        self._data[PENDING_DEPOSITS_FILE][record["key"]] = dict(record)
+        self._write(PENDING_DEPOSITS_FILE)
+
+    def _delete_pending_deposit(self, key: str) -> None:
+        if self._data[PENDING_DEPOSITS_FILE].pop(key, None) is not None:
+            self._write(PENDING_DEPOSITS_FILE)
+
+    def _load_pending_deposits(self) -> List[Dict]:
+        return [dict(record) for record in self._data[PENDING_DEPOSITS_FILE].values()]
+
+    def _load_stats(self) -> Dict[str, Dict[str, float]]:
+        return {stat: dict(totals) for stat, totals in self._data[STATS_FILE].items()}
+
+    def _save_stats(self, changes: Dict[str, Dict[str, float]]) -> None:
+        for stat, totals in changes.items():
+            self._data[STATS_FILE].setdefault(stat, {}).update(totals)
+        self._write(STATS_FILE, indent=None)
+
+    def _get_ticket(self, user_id: str) -> Optional[str]:
+        return self._data[TICKET_STATUS_FILE].get(user_id)
+
+    def _set_ticket(self, user_id: str, channel_name: str) -> None:
+        self._data[TICKET_STATUS_FILE][user_id] = channel_name
+        self._write(TICKET_STATUS_FILE)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS balances (
+    user_id TEXT PRIMARY KEY,
+    balance REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ledger_balances (
+    user_id INTEGER PRIMARY KEY,
+    micros INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ledger_keys (
+    key TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS wallets (
+    user_id TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    address TEXT NOT NULL UNIQUE,
+    PRIMARY KEY (user_id, currency)
+);
+CREATE TABLE IF NOT EXISTS deposits (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    amount REAL NOT NULL,
+    tx_hash TEXT,
+    timestamp INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS deposits_user ON deposits (user_id, id);
+CREATE INDEX IF NOT EXISTS deposits_tx ON deposits (tx_hash);
+CREATE TABLE IF NOT EXISTS withdrawals (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    amount REAL NOT NULL,
+    address TEXT,
+    tx_hash TEXT,
+    timestamp INTEGER NOT NULL,
+    channel_id INTEGER,
+    message_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS withdrawals_user ON withdrawals (user_id, id);
+CREATE INDEX IF NOT EXISTS withdrawals_tx ON withdrawals (tx_hash);
+CREATE INDEX IF NOT EXISTS withdrawals_address ON withdrawals (address);
+CREATE TABLE IF NOT EXISTS coinflip_games (
+    game_number INTEGER PRIMARY KEY,
+    initiator_id INTEGER NOT NULL,
+    amount REAL NOT NULL,
+    side TEXT NOT NULL,
+    start_time INTEGER NOT NULL,
+    opponent_id TEXT,
+    state TEXT NOT NULL,
+    resolve_at INTEGER,
+    channel_id INTEGER,
+    message_id INTEGER,
+    win_probability REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_stats (
+    stat TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    total REAL NOT NULL,
+    PRIMARY KEY (stat, user_id)
+);
+CREATE TABLE IF NOT EXISTS ticket_status (
+    user_id TEXT PRIMARY KEY,
+    channel_name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pending_deposits (
+    key TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    value REAL NOT NULL,
+    currency TEXT NOT NULL,
+    tx_hash TEXT NOT NULL,
+    input_address TEXT NOT NULL,
+    received_at INTEGER NOT NULL
+);
+"""
+
+
+class SqliteStorage(Storage):
+    """SQLite (WAL mode) backend with indexed point lookups"""
+
+    def __init__(self, path: str = "bot.db", import_directory: Optional[str] = "."):
+        super().__init__()
+        self._path = path
+        self._import_directory = import_directory
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _open(self) -> None:
+        is_new = not os.path.exists(self._path)
+        self._conn = sqlite3.connect(self._path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        if is_new and self._import_directory is not None:
+            try:
+                import_json_files(self, self._import_directory)
+            except Exception:
+                # The import rolled back; drop the empty database so the next start retries
+                self._close()
+                for suffix in ("", "-wal", "-shm"):
+                    if os.path.exists(self._path + suffix):
+                        os.remove(self._path + suffix)
+                raise
+
+    def _close(self) -> None:
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+
+    def _migrate_balances(self) -> None:
+        """Move balances from the float dollar table into integer micro-USD, once"""
+        rows = self._conn.execute("SELECT user_id, balance FROM balances").fetchall()
+        if not rows:
+            return
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO ledger_balances (user_id, micros) VALUES (?, ?)",
+                ((int(row["user_id"]), to_micros(row["balance"])) for row in rows)
+            )
+            self._conn.execute("DELETE FROM balances")
+        logger.info(f"Migrated {len(rows)} balances to integer micro-USD")
+
+    def _load_balances(self) -> Tuple[int, Dict[str, int]]:
+        self._migrate_balances()
+        row = self._conn.execute("SELECT value FROM counters WHERE name = 'ledger_seq'").fetchone()
+        balances = {str(row["user_id"]): row["micros"] for row in self._conn.execute("SELECT user_id, micros FROM ledger_balances")}
+        return (row["value"] if row else 0), balances
+
+    def _save_balances(self, seq: int, changes: Dict[str, int], keys: List[str] = ()) -> None:
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO ledger_balances (user_id, micros) VALUES (?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET micros = excluded.micros",
+                ((int(user_id), micros) for user_id, micros in changes.items())
+            )
+            self._conn.executemany("INSERT OR IGNORE INTO ledger_keys (key) VALUES (?)", ((key,) for key in keys))
+            self._conn.execute(
+                "INSERT INTO counters (name, value) VALUES ('ledger_seq', ?) "
+                "ON CONFLICT (name) DO UPDATE SET value = excluded.value",
+                (seq,)
+            )
+
+    def _load_ledger_keys(self) -> Set[str]:
+        return {row["key"] for row in self._conn.execute("SELECT key FROM ledger_keys")}
+
+    def _get_wallets(self, user_id: str) -> Dict[str, str]:
+        rows = self._conn.execute("SELECT currency, address FROM wallets WHERE user_id = ?", (user_id,))
+        return {row["currency"]: row["address"] for row in rows}
+
+    def _set_wallet(self, user_id: str, currency: str, address: str) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO wallets (user_id, currency, address) VALUES (?, ?, ?)",
+                (user_id, currency, address)
+            )
+
+    def _find_wallet(self, address: str) -> Optional[Tuple[str, str]]:
+        row = self._conn.execute("SELECT user_id, currency FROM wallets WHERE address = ?", (address,)).fetchone()
+        return (row["user_id"], row["currency"]) if row else None
+
+    def _get_all_wallets(self) -> List[Tuple[str, str, str]]:
+        rows = self._conn.execute("SELECT user_id, currency, address FROM wallets")
+        return [(row["user_id"], row["currency"], row["address"]) for row in rows]
+
+    def _add_record(self, table: str, user_id: str, record: Dict) -> None:
+        fields = DEPOSIT_FIELDS if table == "deposits" else WITHDRAWAL_FIELDS
+        with self._conn:
+            self._conn.execute(
+                f"INSERT INTO {table} (user_id, {', '.join(fields)}) VALUES (?{', ?' * len(fields)})",
+                (user_id, *(record.get(field) for field in fields))
+            )
+
+    def _get_records(self, table: str, user_id: str, limit: int) -> List[Dict]:
+        fields = DEPOSIT_FIELDS if table == "deposits" else WITHDRAWAL_FIELDS
+        rows = self._conn.execute(
+            f"SELECT {', '.join(fields)} FROM {table} WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+            (user_id, limit)
+        ).fetchall()
+        return [{key: row[key] for key in fields if row[key] is not None} for row in reversed(rows)]
+
+    def _get_history_page(self, table: str, user_id: str, limit: int,
+                          before: Optional[int], after: Optional[int]) -> List[Dict]:
+        fields = DEPOSIT_FIELDS if table == "deposits" else WITHDRAWAL_FIELDS
+        columns = f"id, {', '.join(fields)}"
+        if after is not None:
+            rows = self._conn.execute(
+                f"SELECT {columns} FROM {table} WHERE user_id = ? AND id > ? ORDER BY id ASC LIMIT ?",
+                (user_id, after, limit)
+            ).fetchall()[::-1]
+        elif before is not None:
+            rows = self._conn.execute(
+                f"SELECT {columns} FROM {table} WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                (user_id, before, limit)
+            ).fetchall()
+        else:
+            rows = self._conn.execute(
+                f"SELECT {columns} FROM {table} WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+                (user_id, limit)
+            ).fetchall()
+        return [{key: row[key] for key in ("id", *fields) if row[key] is not None} for row in rows]
+
+    def _get_history_summary(self, table: str, user_id: str) -> Tuple[int, float]:
+        row = self._conn.execute(
+            f"SELECT COUNT(*) AS count, COALESCE(SUM(amount), 0) AS total FROM {table} WHERE user_id = ?",
+            (user_id,)
+        ).fetchone()
+        return row["count"], row["total"]
+
+    def _get_totals(self, table: str) -> Dict[str, float]:
+        rows = self._conn.execute(f"SELECT user_id, SUM(amount) AS total FROM {table} GROUP BY user_id")
+        return {row["user_id"]: row["total"] for row in rows}
+
+    def _increment_counter(self, name: str, start: int, count: int) -> int:
+        with self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO counters (name, value) VALUES (?, ?)", (name, start))
+            value = self._conn.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()["value"]
+            self._conn.execute("UPDATE counters SET value = ? WHERE name = ?", (value + count, name))
+        return value
+
+    def _save_game(self, record: Dict) -> None:
+        with self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO coinflip_games ({', '.join(COINFLIP_FIELDS)}) "
+                f"VALUES (?{', ?' * (len(COINFLIP_FIELDS) - 1)})",
+                tuple(record.get(field) for field in COINFLIP_FIELDS)
+            )
+
+    def _delete_games(self, game_numbers: List[int]) -> None:
+        with self._conn:
+            self._conn.executemany("DELETE FROM coinflip_games WHERE game_number = ?", ((n,) for n in game_numbers))
+
+    def _load_games(self) -> List[Dict]:
+        rows = self._conn.execute(f"SELECT {', '.join(COINFLIP_FIELDS)} FROM coinflip_games")
+        return [{key: row[key] for key in COINFLIP_FIELDS} for row in rows]
+
+    def _save_pending_deposit(self, record: Dict) -> None:
+        with self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO pending_deposits ({', '.join(PENDING_DEPOSIT_FIELDS)}) "
+                f"VALUES (?{', ?' * (len(PENDING_DEPOSIT_FIELDS) - 1)})",
+                tuple(record[field] for field in PENDING_DEPOSIT_FIELDS)
+            )
+
+    def _delete_pending_deposit(self, key: str) -> None:
+        with self._conn:
+            self._conn.execute("DELETE FROM pending_deposits WHERE key = ?", (key,))
+
+    def _load_pending_deposits(self) -> List[Dict]:
+        rows = self._conn.execute(f"SELECT {', '.join(PENDING_DEPOSIT_FIELDS)} FROM pending_deposits")
+        return [{field: row[field] for field in PENDING_DEPOSIT_FIELDS} for row in rows]
+
+    def _load_stats(self) -> Dict[str, Dict[str, float]]:
+        stats: Dict[str, Dict[str, float]] = {}
+        for row in self._conn.execute("SELECT stat, user_id, total FROM user_stats"):
+            stats.setdefault(row["stat"], {})[row["user_id"]] = row["total"]
+        return stats
+
+    def _save_stats(self, changes: Dict[str, Dict[str, float]]) -> None:
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO user_stats (stat, user_id, total) VALUES (?, ?, ?) "
+                "ON CONFLICT (stat, user_id) DO UPDATE SET total = excluded.total",
+                ((stat, user_id, total) for stat, totals in changes.items() for user_id, total in totals.items())
+            )
+
+    def _get_ticket(self, user_id: str) -> Optional[str]:
+        row = self._conn.execute("SELECT channel_name FROM ticket_status WHERE user_id = ?", (user_id,)).fetchone()
+        return row["channel_name"] if row else None
+
+    def _set_ticket(self, user_id: str, channel_name: str) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ticket_status (user_id, channel_name) VALUES (?, ?)",
+                (user_id, channel_name)
+            )
+
+
+def read_keys_file(path: str, repair: bool = False) -> Set[str]:
+    """Read the append-only ledger keys file; with repair, a torn last line is cut off"""
+    keys: Set[str] = set()
+    good_offset = 0
+    try:
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("unterminated line")
+                    key = json.loads(line)
+                except ValueError:  # Includes JSONDecodeError and UnicodeDecodeError
+                    logger.warning(f"Discarding torn tail of {path} at byte {good_offset}")
+                    break
+                keys.add(key)
+                good_offset += len(line)
+            torn = f.seek(0, os.SEEK_END) != good_offset
+    except FileNotFoundError:
+        return keys
+    if repair and torn:
+        with open(path, "r+b") as f:
+            f.truncate(good_offset)
+            os.fsync(f.fileno())
+    return keys
+
+
+def load_balances_file(path: str) -> Tuple[int, Dict[str, int]]:
+    """Read a balances snapshot as micro-USD, accepting the older float dollar formats"""
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        logger.warning(f"{path} not found, starting with an empty ledger")
+        return 0, {}
+
+    if data.get("unit") == BALANCE_UNIT:
+        return data["seq"], {str(user_id): int(micros) for user_id, micros in data["balances"].items()}
+    if "balances" in data and "seq" in data:
+        seq, balances = data["seq"], data["balances"]
+    else:
+        seq, balances = 0, data  # Pre-journal {user_id: balance} format
+    return seq, {str(user_id): to_micros(float(balance)) for user_id, balance in balances.items()}
+
+
+def import_json_files(storage: SqliteStorage, directory: str = ".") -> None:
+    """One-shot import of the legacy JSON files into a fresh SQLite database.
+
+    Runs on the storage thread, in a single transaction so a failure leaves
+    nothing behind. The balances snapshot keeps its journal seq, so the ledger
+    still replays any newer records from the existing journal.
+    """
+    def read(name: str, default: Any) -> Any:
+        try:
+            with open(os.path.join(directory, name), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return default
+
+    seq, balances = load_balances_file(os.path.join(directory, BALANCES_FILE))
+    keys = set(read(BALANCES_FILE, {}).get("keys", []))
+    keys |= read_keys_file(os.path.join(directory, LEDGER_KEYS_FILE))
+    conn = storage._conn
+    with conn:
+        conn.executemany("INSERT INTO ledger_balances (user_id, micros) VALUES (?, ?)",
+                         ((int(user_id), micros) for user_id, micros in balances.items()))
+        conn.executemany("INSERT INTO ledger_keys (key) VALUES (?)", ((key,) for key in keys))
+        conn.execute("INSERT INTO counters (name, value) VALUES ('ledger_seq', ?)", (seq,))
+
+        conn.executemany(
+            "INSERT OR REPLACE INTO wallets (user_id, currency, address) VALUES (?, ?, ?)",
+            ((str(user_id), currency, address)
+             for user_id, user_wallets in read(WALLETS_FILE, {}).items()
+             for currency, address in user_wallets.items())
+        )
+
+        for table, name, fields in (("deposits", DEPOSITS_FILE, DEPOSIT_FIELDS),
+                                    ("withdrawals", WITHDRAWALS_FILE, WITHDRAWAL_FIELDS)):
+            statement = f"INSERT INTO {table} (user_id, {', '.join(fields)}) VALUES (?{', ?' * len(fields)})"
+            for user_id, records in read(name, {}).items():
+                for record in records:
+                    try:
+                        conn.execute(statement, (str(user_id), *(record.get(field) for field in fields)))
+                    except sqlite3.IntegrityError as e:
+                        logger.warning(f"Skipping invalid {table} record for user {user_id}: {e}")
+
+        conn.executemany("INSERT OR REPLACE INTO counters (name, value) VALUES (?, ?)",
+                         read(GAME_NUMBER_FILE, {}).items())
+
+        conn.executemany("INSERT OR REPLACE INTO ticket_status (user_id, channel_name) VALUES (?, ?)",
+                         ((str(user_id), channel_name) for user_id, channel_name in read(TICKET_STATUS_FILE, {}).items()))
+
+        conn.executemany(
+            f"INSERT OR REPLACE INTO coinflip_games ({', '.join(COINFLIP_FIELDS)}) "
+            f"VALUES (?{', ?' * (len(COINFLIP_FIELDS) - 1)})",
+            (tuple(record.get(field) for field in COINFLIP_FIELDS) for record in read(COINFLIPS_FILE, {}).values())
+        )
+
+        conn.executemany(
+            "INSERT OR REPLACE INTO user_stats (stat, user_id, total) VALUES (?, ?, ?)",
+            ((stat, str(user_id), total) for stat, totals in read(STATS_FILE, {}).items()
+             for user_id, total in totals.items())
+        )
+
+        pending = read(PENDING_DEPOSITS_FILE, {})
+        conn.executemany(
+            f"INSERT OR REPLACE INTO pending_deposits ({', '.join(PENDING_DEPOSIT_FIELDS)}) "
+            f"VALUES (?{', ?' * (len(PENDING_DEPOSIT_FIELDS) - 1)})",
+            (tuple(record[field] for field in PENDING_DEPOSIT_FIELDS) for record in pending.values())
+        )
+
+    logger.info(f"Imported {len(balances)} balances, {len(keys)} deposit keys, {len(pending)} pending deposits "
+                f"and legacy JSON data from {directory}")
+
+
+def create_storage(backend: str = "sqlite") -> Storage:
+    """Build the storage backend named by STORAGE_BACKEND"""
+    if backend == "json":
+        return JsonStorage(".")
+    return SqliteStorage("bot.db")
@@ -0,0 +1,36 @@
+import logging
+from typing import Dict, Optional, Tuple
+
+from core.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+
+class WalletRegistry:
+    """Deposit wallets plus an in-memory address -> (user_id, currency) index.
+
+    The index is built once at startup and kept current by assign(), so the
+    callback path resolves an address with a single dict lookup.
+    """
+
+    def __init__(self, storage: Storage):
+        self._storage = storage
+        self._by_address: Dict[str, Tuple[str, str]] = {}
+
+    async def load(self) -> None:
+        """Build the address index from storage"""
+        rows = await self._storage.get_all_wallets()
+        self._by_address = {address: (user_id, currency) for user_id, currency, address in rows}
+        logger.info(f"Indexed {len(self._by_address)} deposit addresses")
+
+    def owner_of(self, address: str) -> Optional[Tuple[str, str]]:
+        """Return (user_id, currency) owning a deposit address"""
+        return self._by_address.get(address)
+
+    async def get_wallets(self, user_id: str) -> Dict[str, str]:
+        return await self._storage.get_wallets(user_id)
+
+    async def assign(self, user_id: str, currency: str, address: str) -> None:
+        """Store a newly generated address and index it"""
+        await self._storage.set_wallet(user_id, currency, address)
+        self._by_address[address] = (str(user_id), currency)
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import time
+import zlib
+from typing import Awaitable, Callable, List, Optional
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_FIELDS = ("input_transaction_hash", "input_address", "value", "currency")
+
+CallbackHandler = Callable[[str, int, str, float, str], Awaitable[None]]
+
+
+class CallbackMetrics:
+    """Counters and timings for callback processing since the last report"""
+
+    __slots__ = ("processed", "failed", "rejected", "wait_total", "wait_max", "run_total", "run_max")
+
+    def __init__(self):
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.wait_total = 0.0  # Seconds queued before a worker picked the callback up
+        self.wait_max = 0.0
+        self.run_total = 0.0  # Seconds spent in the handler
+        self.run_max = 0.0
+
+    def observe(self, wait: float, run: float, failed: bool) -> None:
+        self.processed += 1
+        self.failed += failed
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self.run_total += run
+        self.run_max = max(self.run_max, run)
+
+    def summary(self) -> str:
+        count = self.processed or 1
+        return (f"{self.processed} processed ({self.failed} failed, {self.rejected} rejected), "
+                f"wait avg {self.wait_total / count * 1000:.0f}ms max {self.wait_max * 1000:.0f}ms, "
+                f"handler avg {self.run_total / count * 1000:.0f}ms max {self.run_max * 1000:.0f}ms")
+
+
+class CallbackServer:
+    """Apirone webhook ingress served by aiohttp on the bot's event loop.
+
+    Requests are validated and queued without awaiting any processing, so the
+    endpoint answers immediately; a full queue answers 503 and Apirone
+    retries later. Callbacks are sharded by input address over a fixed pool
+    of workers, each draining its own queue in arrival order, so the
+    confirmations of one address apply in order while different addresses
+    are processed concurrently. A handler that raises is logged and counted
+    as failed; queue depth, failures and latencies are logged every
+    report_interval seconds.
+    """
+
+    def __init__(self, handler: CallbackHandler, host: str = "0.0.0.0", port: int = 5000,
+                 queue_size: int = 1000, workers: int = 4, report_interval: float = 300.0,
+                 drain_timeout: float = 10.0):
+        self._handler = handler
+        self._host = host
+        self._port = port
+        shard_size = max(queue_size // workers, 1)
+        self._queues: List[asyncio.Queue] = [asyncio.Queue(maxsize=shard_size) for _ in range(workers)]
+        self._report_interval = report_interval
+        self._drain_timeout = drain_timeout
+        self._runner: Optional[web.AppRunner] = None
+        self._tasks: List[asyncio.Task] = []
+        self.metrics = CallbackMetrics()
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post("/callback", self._callback)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self._host, self._port).start()
+        self._tasks = [asyncio.create_task(self._work(queue)) for queue in self._queues]
+        self._tasks.append(asyncio.create_task(self._report_loop()))
+        logger.info(f"Callback server listening on {self._host}:{self._port} with {len(self._queues)} workers")
+
+    async def close(self) -> None:
+        """Stop accepting callbacks, give the queued ones a chance to finish, then stop the workers"""
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+        if self.pending:
+            try:
+                await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self._queues)), self._drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Dropping {self.pending} queued callbacks on shutdown")
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    @property
+    def pending(self) -> int:
+        return sum(queue.qsize() for queue in self._queues)
+
+    def _shard(self, input_address: str) -> asyncio.Queue:
+        return self._queues[zlib.crc32(input_address.encode()) % len(self._queues)]
+
+    async def _callback(self, request: web.Request) -> web.Response:
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.json_response({"error": "Invalid JSON"}, status=400)
+        if not isinstance(data, dict) or not data:
+            return web.json_response({"error": "No data received"}, status=400)
+
+        logger.info(f"Callback received: {data}")
+
+        if not all(data.get(field) for field in REQUIRED_FIELDS):
+            logger.warning("Missing required fields in callback")
+            return web.json_response({"error": "Missing required fields"}, status=400)
+        try:
+            event = {
+                "tx_hash": str(data["input_transaction_hash"]),
+                "confirmations": int(data.get("confirmations", 0)),
+                "input_address": str(data["input_address"]),
+                "value": float(data["value"]),
+                "currency": str(data["currency"])
+            }
+        except (TypeError, ValueError):
+            logger.warning(f"Malformed callback fields: {data}")
+            return web.json_response({"error": "Malformed fields"}, status=400)
+
+        try:
+            self._shard(event["input_address"]).put_nowait((time.monotonic(), event))
+        except asyncio.QueueFull:
+            self.metrics.rejected += 1
+            logger.warning(f"Callback queue for {event['input_address']} full, rejecting callback")
+            return web.json_response({"error": "Busy"}, status=503)
+
+        return web.json_response({"status": "success"})
+
+    async def _work(self, queue: asyncio.Queue) -> None:
+        while True:
+            queued_at, event = await queue.get()
+            started_at = time.monotonic()
+            failed = False
+            try:
+                await self._handler(**event)
+            except Exception as e:
+                failed = True
+                logger.error(f"Error processing callback {event['tx_hash']}: {e}")
+            finally:
+                self.metrics.observe(started_at - queued_at, time.monotonic() - started_at, failed)
+                queue.task_done()
+
+    async def _report_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._report_interval)
+            metrics, self.metrics = self.metrics, CallbackMetrics()
+            if metrics.processed or metrics.rejected or self.pending:
+                depths = ", ".join(str(queue.qsize()) for queue in self._queues)
+                logger.info(f"Callbacks: {metrics.summary()}; queue depth {self.pending} ({depths})")
@@ -0,0 +1,53 @@
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from core.history import HistoryStore
+
+logger = logging.getLogger(__name__)
+
+
+class WithdrawalRegistry:
+    """Withdrawal log plus an in-memory index of transfers awaiting a callback.
+
+    Pending transfers are keyed by tx hash and by (destination address,
+    currency), so the callback path finds the processing message with a dict
+    lookup instead of re-reading the withdrawal history. A batched transfer
+    indexes several withdrawals under the same tx hash.
+    """
+
+    def __init__(self, history: HistoryStore):
+        self._history = history
+        self._by_tx: Dict[str, List[Dict]] = {}
+        self._by_address: Dict[Tuple[str, str], Dict] = {}
+
+    async def record(self, user_id: str, record: Dict) -> None:
+        """Log a withdrawal and index it until its callback arrives"""
+        await self._history.add_withdrawal(user_id, record)
+        if not (record.get("channel_id") and record.get("message_id")):
+            return
+        tx_hash = record.get("tx_hash")
+        if tx_hash and tx_hash != "N/A":
+            self._by_tx.setdefault(tx_hash, []).append(record)
+        if record.get("address"):
+            self._by_address[(record["address"], record["currency"])] = record
+
+    def pop(self, tx_hash: str, address: str, currency: str) -> Optional[Dict]:
+        """Return and forget the pending withdrawal matching a callback"""
+        pending = self._by_tx.get(tx_hash)
+        if pending:
+            # Several withdrawals can share a batched tx; prefer the one for this address
+            record = next((r for r in pending if r.get("address") == address), pending[0])
+        else:
+            record = self._by_address.get((address, currency))
+        if record is None:
+            return None
+
+        siblings = self._by_tx.get(record.get("tx_hash"))
+        if siblings and record in siblings:
+            siblings.remove(record)
+            if not siblings:
+                del self._by_tx[record["tx_hash"]]
+        key = (record.get("address"), record.get("currency"))
+        if self._by_address.get(key) is record:
+            del self._by_address[key]
+        return record
@@ -0,0 +1,23 @@
+import os
+
+import pytest
+
+from core import journal
+
+
+@pytest.fixture
+def fail_next_fsync(monkeypatch):
+    """Call with a ledger to make the next fsync of its journal raise, as a full or failing disk would"""
+    def install(ledger):
+        journal_fd = ledger._journal._file.fileno()
+        real_fsync = os.fsync
+        failed = []
+
+        def fsync(fd):
+            if fd == journal_fd and not failed:
+                failed.append(fd)
+                raise OSError("No space left on device")
+            real_fsync(fd)
+
+        monkeypatch.setattr(journal.os, "fsync", fsync)
+    return install
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from core.coinflip import CoinflipEngine, CoinflipError
+from core.ledger import Ledger
+from core.scheduler import Scheduler
+from core.sequence import SequenceAllocator
+from core.stats import StatsStore
+from core.storage import JsonStorage
+
+
+def run_engine(tmp_path, scenario):
+    async def main():
+        storage = JsonStorage(str(tmp_path))
+        await storage.open()
+        ledger = Ledger(storage, journal_path=str(tmp_path / "balances.json.wal"))
+        await ledger.start()
+        scheduler = Scheduler()
+        engine = CoinflipEngine(ledger, storage, scheduler, SequenceAllocator(storage, "coinflip"),
+                                StatsStore(storage), countdown=3600)
+        await engine.start()
+        try:
+            return await scenario(engine, ledger, storage)
+        finally:
+            await engine.close()
+            await ledger.close()
+            await storage.close()
+    return asyncio.run(main())
+
+
+def test_bets_saved_mid_debit_are_reconciled_on_restart(tmp_path):
+    async def scenario(engine, ledger, storage):
+        await ledger.set_balance(1, 10_000_000)
+        await ledger.set_balance(2, 10_000_000)
+        await ledger.set_balance(3, 10_000_000)
+        debited = await engine.create(1, 2.0, "heads")
+        await engine.join(debited.game_number, 2)
+        # Crash right after each bet's debit, before the game moved on
+        await ledger.try_debit(3, 2_000_000, key="coinflip:90:bet:3")
+        await storage.save_game({**debited.to_record(), "game_number": 90, "initiator_id": 3,
+                                 "opponent_id": None, "state": "pending"})
+        await storage.save_game({**debited.to_record(), "game_number": 91, "initiator_id": 3,
+                                 "opponent_id": None, "state": "pending"})
+        open_game = await engine.create(1, 1.0, "tails")
+        await storage.save_game({**open_game.to_record(), "opponent_id": 2, "state": "joining"})
+        await ledger.try_debit(3, 1_000_000, key="coinflip:92:bet:2")
+        await storage.save_game({**open_game.to_record(), "game_number": 92, "opponent_id": 2, "state": "joining"})
+
+    run_engine(tmp_path, scenario)
+
+    async def restart(engine, ledger, storage):
+        states = {game.game_number: (game.state, game.opponent_id) for game in engine.games()}
+        return states, sorted(record["game_number"] for record in await storage.load_games())
+
+    states, saved = run_engine(tmp_path, restart)
+    assert states == {1: ("started", 2), 2: ("open", None), 90: ("open", None), 92: ("started", 2)}
+    assert saved == [1, 2, 90, 92]
+
+
+def test_failed_save_refuses_the_bet(tmp_path, monkeypatch):
+    async def scenario(engine, ledger, storage):
+        await ledger.set_balance(1, 10_000_000)
+
+        async def fail(record):
+            raise OSError("No space left on device")
+        monkeypatch.setattr(storage, "save_game", fail)
+        with pytest.raises(CoinflipError):
+            await engine.create(1, 2.0, "heads")
+        return ledger.get_balance(1), engine.games()
+
+    assert run_engine(tmp_path, scenario) == (10_000_000, [])
@@ -0,0 +1,68 @@
+import asyncio
+
+from core.deposits import PendingDeposits
+from core.ledger import Ledger
+from core.storage import JsonStorage
+
+KEY = "deposit:btc:tx1:addr"
+
+
+def make_credit(ledger):
+    """The ledger side of bot.update_balance_async, at a fixed $5 price"""
+    async def credit(user_id, value, currency, tx_hash, input_address):
+        if ledger.has_applied(KEY):
+            return False
+        return await ledger.credit_once(KEY, user_id, 5_000_000, reason=f"deposit {tx_hash}") is not None
+    return credit
+
+
+def run(tmp_path, scenario):
+    async def main():
+        storage = JsonStorage(str(tmp_path))
+        await storage.open()
+        ledger = Ledger(storage, journal_path=str(tmp_path / "balances.json.wal"))
+        await ledger.start()
+        deposits = PendingDeposits(storage, make_credit(ledger), retry_interval=0.01)
+        await deposits.start()
+        try:
+            return await scenario(ledger, deposits)
+        finally:
+            await deposits.close()
+            await ledger.close()
+            await storage.close()
+    return asyncio.run(main())
+
+
+def submit_failing_once(fail_next_fsync):
+    async def scenario(ledger, deposits):
+        fail_next_fsync(ledger)
+        try:
+            await deposits.submit(KEY, "1", 0.0001, "btc", "tx1", "addr")
+        except OSError:
+            pass
+        return ledger.get_balance(1), ledger.has_applied(KEY), deposits.pending
+    return scenario
+
+
+def test_failed_credit_is_retried(tmp_path, fail_next_fsync):
+    async def retried(ledger, deposits):
+        state = await submit_failing_once(fail_next_fsync)(ledger, deposits)
+        await asyncio.sleep(0.05)
+        return state, ledger.get_balance(1), deposits.pending
+
+    assert run(tmp_path, retried) == ((0, False, 1), 5_000_000, 0)
+
+
+def test_failed_credit_survives_restart(tmp_path, fail_next_fsync):
+    async def crash_before_retry(ledger, deposits):
+        state = await submit_failing_once(fail_next_fsync)(ledger, deposits)
+        await deposits.close()  # Stops the retry loop, as a crash would
+        return state
+
+    assert run(tmp_path, crash_before_retry) == (0, False, 1)
+
+    async def after_restart(ledger, deposits):
+        await asyncio.sleep(0.05)
+        return ledger.get_balance(1), deposits.pending, await deposits._storage.load_pending_deposits()
+
+    assert run(tmp_path, after_restart) == (5_000_000, 0, [])
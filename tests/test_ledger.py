@@ -0,0 +1,174 @@
+import asyncio
+import json
+
+import pytest
+
+from core.ledger import Ledger
+from core.storage import JsonStorage
+
+
+def run_ledger(tmp_path, scenario):
+    async def main():
+        storage = JsonStorage(str(tmp_path))
+        await storage.open()
+        ledger = Ledger(storage, journal_path=str(tmp_path / "balances.json.wal"))
+        await ledger.start()
+        try:
+            return await scenario(ledger)
+        finally:
+            await ledger.close()
+            await storage.close()
+    return asyncio.run(main())
+
+
+def test_transfer_to_self_is_rejected(tmp_path):
+    async def scenario(ledger):
+        await ledger.set_balance(1, 10_500_000)
+        with pytest.raises(ValueError):
+            await ledger.transfer(1, "1", 1_000_000)
+        return ledger.get_balance(1)
+
+    assert run_ledger(tmp_path, scenario) == 10_500_000
+
+
+def test_transfer_moves_funds(tmp_path):
+    async def scenario(ledger):
+        await ledger.set_balance(1, 10_500_000)
+        balances = await ledger.transfer(1, 2, 1_000_000)
+        return balances, await ledger.transfer(2, 1, 5_000_000)
+
+    balances, overdraft = run_ledger(tmp_path, scenario)
+    assert balances == {"1": 9_500_000, "2": 1_000_000}
+    assert overdraft is None
+
+
+def test_balances_mapping_ignores_non_numeric_ids(tmp_path):
+    async def scenario(ledger):
+        await ledger.set_balance(1, 2_000_000)
+        balances = ledger.balances()
+        return balances.get("PvP Bot", 0), "PvP Bot" in balances, ledger.get_balance("PvP Bot"), balances.get("1")
+
+    assert run_ledger(tmp_path, scenario) == (0, False, 0, 2_000_000)
+
+
+def test_failed_append_is_reverted(tmp_path, fail_next_fsync):
+    async def scenario(ledger):
+        await ledger.set_balance(1, 5_000_000)
+        fail_next_fsync(ledger)
+        with pytest.raises(OSError):
+            await ledger.transfer(1, 2, 1_000_000)
+        after_failure = (ledger.get_balance(1), ledger.has_account(2))
+        fail_next_fsync(ledger)
+        with pytest.raises(OSError):
+            await ledger.credit_once("deposit:btc:tx1:a", 1, 2_000_000)
+        assert not ledger.has_applied("deposit:btc:tx1:a")
+        await ledger.credit(1, 1)
+        return after_failure
+
+    assert run_ledger(tmp_path, scenario) == (5_000_000, False)
+
+    async def reload(ledger):
+        return dict(ledger.balances()), ledger.has_applied("deposit:btc:tx1:a")
+
+    assert run_ledger(tmp_path, reload) == ({"1": 5_000_001}, False)
+
+
+def test_dollar_journal_records_are_upgraded(tmp_path):
+    legacy = [
+        {"seq": 1, "op": "credit", "user": "1", "amount": 10, "reason": ""},
+        {"seq": 2, "op": "debit", "user": "1", "amount": 1, "reason": ""},
+        {"seq": 3, "op": "txn", "deltas": {"1": -0.5, "2": 0.5}, "reason": ""},
+    ]
+    (tmp_path / "balances.json.wal").write_text("".join(json.dumps(record) + "\n" for record in legacy))
+
+    async def scenario(ledger):
+        await ledger.credit(2, 1)
+        return dict(ledger.balances())
+
+    assert run_ledger(tmp_path, scenario) == {"1": 8_500_000, "2": 500_001}
+
+
+def test_compacted_keys_are_appended_outside_the_snapshot(tmp_path):
+    (tmp_path / "balances.json").write_text(json.dumps(
+        {"seq": 0, "unit": "micros", "balances": {"1": 1_000_000}, "keys": ["deposit:btc:old:a"]}))
+
+    async def scenario(ledger):
+        await ledger.credit_once("deposit:btc:tx1:a", 1, 2_000_000)
+        await ledger.compact()
+        await ledger.credit_once("deposit:btc:tx2:a", 1, 3_000_000)
+        await ledger.compact()
+
+    run_ledger(tmp_path, scenario)
+    assert "keys" not in json.loads((tmp_path / "balances.json").read_text())
+    with open(tmp_path / "ledger_keys.jsonl", "ab") as f:
+        f.write(b'"deposit:btc:to')  # Torn append
+
+    async def reload(ledger):
+        return (ledger.get_balance(1),
+                [await ledger.credit_once(key, 1, 1) for key in ("deposit:btc:old:a", "deposit:btc:tx1:a",
+                                                                "deposit:btc:tx2:a")])
+
+    assert run_ledger(tmp_path, reload) == (6_000_000, [None, None, None])
+    assert (tmp_path / "ledger_keys.jsonl").read_bytes().endswith(b"\n")
+
+
+def journal_lines(*records):
+    return "".join(json.dumps({"op": "credit", "reason": "", "unit": "micros", **record}) + "\n" for record in records)
+
+
+def test_torn_journal_tail_is_cut_off_on_replay(tmp_path):
+    wal = tmp_path / "balances.json.wal"
+    complete = journal_lines({"seq": 1, "user": "1", "amount": 1_000_000})
+    torn = journal_lines({"seq": 2, "user": "1", "amount": 2_000_000})
+    wal.write_text(complete + torn[:-1])  # Crashed before the newline: valid JSON, but never acknowledged
+
+    async def scenario(ledger):
+        replayed = ledger.get_balance(1)
+        await ledger.credit(1, 5)
+        return replayed
+
+    assert run_ledger(tmp_path, scenario) == 1_000_000
+
+    async def reload(ledger):
+        return ledger.get_balance(1)
+
+    assert run_ledger(tmp_path, reload) == 1_000_005
+
+    wal.write_text(complete + torn[:20])  # Crashed mid-record
+    (tmp_path / "balances.json").unlink()
+    assert run_ledger(tmp_path, reload) == 1_000_000
+    assert wal.read_text() == ""  # Folded into the snapshot on close
+
+
+def test_crash_between_snapshot_and_truncate_replays_nothing_twice(tmp_path, monkeypatch):
+    async def no_truncate(self, seq):
+        pass  # As if the process died right after the snapshot was saved
+
+    async def scenario(ledger):
+        await ledger.credit(1, 3_000_000)
+        await ledger.transfer(1, 2, 1_000_000)
+        monkeypatch.setattr(type(ledger._journal), "truncate_through", no_truncate)
+        await ledger.compact()
+
+    run_ledger(tmp_path, scenario)
+    monkeypatch.undo()
+    assert len((tmp_path / "balances.json.wal").read_text().splitlines()) == 2
+
+    async def reload(ledger):
+        return dict(ledger.balances())
+
+    assert run_ledger(tmp_path, reload) == {"1": 2_000_000, "2": 1_000_000}
+
+
+def test_credit_once_dedupes_across_restarts(tmp_path):
+    key = "deposit:btc:tx1:a"
+
+    async def scenario(ledger):
+        return await ledger.credit_once(key, 1, 4_000_000), await ledger.credit_once(key, 1, 4_000_000)
+
+    assert run_ledger(tmp_path, scenario) == (4_000_000, None)
+
+    async def retry(ledger):
+        return await ledger.credit_once(key, 1, 4_000_000), ledger.get_balance(1)
+
+    assert run_ledger(tmp_path, retry) == (None, 4_000_000)
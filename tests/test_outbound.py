@@ -0,0 +1,54 @@
+import asyncio
+
+from core.outbound import COSMETIC, INTERACTIVE, NORMAL, Outbox
+
+
+def run_outbox(scenario, **options):
+    async def main():
+        outbox = Outbox(**options)
+        await outbox.start()
+        try:
+            return await scenario(outbox)
+        finally:
+            await outbox.close()
+    return asyncio.run(main())
+
+
+def recorder(sent):
+    def call(route):
+        async def send(content):
+            sent.append((route, content))
+        return send
+    return call
+
+
+def test_throttled_route_does_not_hold_back_others():
+    sent = []
+    call = recorder(sent)
+
+    async def scenario(outbox):
+        flooded = [outbox.submit("a", call("a"), NORMAL, content=i) for i in range(5)]
+        await asyncio.sleep(0.05)
+        quiet = [outbox.submit("b", call("b"), NORMAL, content="later"),
+                 outbox.submit("b", call("b"), INTERACTIVE, content="urgent")]
+        await asyncio.wait_for(asyncio.gather(*quiet), timeout=1)
+        return outbox.pending, flooded
+
+    pending, flooded = run_outbox(scenario, channel_rate=1.0, channel_burst=2, drain_timeout=0)
+    assert sent == [("a", 0), ("a", 1), ("b", "urgent"), ("b", "later")]
+    assert pending == 3
+
+
+def test_queued_edits_merge_and_take_the_more_urgent_priority():
+    sent = []
+    call = recorder(sent)
+
+    async def scenario(outbox):
+        await outbox.submit("a", call("a"), NORMAL, content="first")  # Uses the route's only token
+        outbox.submit("a", call("a"), NORMAL, content="notice")
+        outbox.submit("a", call("a"), COSMETIC, merge_key="m", content="draft")
+        edit = outbox.submit("a", call("a"), INTERACTIVE, merge_key="m", content="final")
+        await asyncio.wait_for(edit, timeout=1)
+
+    run_outbox(scenario, channel_rate=20.0, channel_burst=1)
+    assert sent == [("a", "first"), ("a", "final"), ("a", "notice")]
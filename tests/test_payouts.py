@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from core.payouts import PayoutPipeline, WithdrawalJob
+
+
+def make_pipeline(**options):
+    async def noop(*args):
+        pass
+    return PayoutPipeline(None, None, None, "account", "key", noop, noop, **options)
+
+
+def test_submit_counts_batched_jobs_against_the_queue_size():
+    async def main():
+        pipeline = make_pipeline(queue_size=2, batch_window=3600)
+        await pipeline.start()
+        try:
+            for request_id in (1, 2):
+                pipeline.submit(WithdrawalJob("1", "btc", 5.0, "addr", request_id, 10))
+                await asyncio.sleep(0)  # Let the collector move it into a batch
+            with pytest.raises(asyncio.QueueFull):
+                pipeline.submit(WithdrawalJob("1", "btc", 5.0, "addr", 3, 10))
+            return pipeline.pending
+        finally:
+            await pipeline.close()
+
+    assert asyncio.run(main()) == 2
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.status = 200
+        self.data = data
+        self.body = b"{}"
+        self.text = "{}"
+
+    def json(self):
+        return self.data
+
+
+class FakeApirone:
+    """Records transfers; the account holds 1 BTC"""
+
+    def __init__(self):
+        self.transfers = []
+
+    async def get(self, url, route):
+        return FakeResponse({"balance": [{"currency": "btc", "available": 10**8}]})
+
+    async def post(self, url, route, json):
+        self.transfers.append(json["destinations"])
+        return FakeResponse({"txs": [f"tx{len(self.transfers)}"]})
+
+
+class FakePrices:
+    async def get_price(self, currency, max_age):
+        return 50_000.0
+
+
+class FakeRegistry:
+    async def record(self, user_id, record):
+        pass
+
+
+def test_jobs_in_one_window_share_a_transfer():
+    apirone = FakeApirone()
+    sent = []
+
+    async def on_sent(job):
+        sent.append((job.request_id, job.tx_hash))
+
+    async def on_failed(job, reason):
+        raise AssertionError(reason)
+
+    async def main():
+        pipeline = PayoutPipeline(apirone, FakePrices(), FakeRegistry(), "account", "key", on_sent, on_failed,
+                                  batch_window=0.05)
+        await pipeline.start()
+        try:
+            for request_id, address in ((1, "a"), (2, "b"), (3, "a")):
+                pipeline.submit(WithdrawalJob(str(request_id), "btc", 50.0, address, request_id, 10))
+            while len(sent) < 3:
+                await asyncio.sleep(0.01)
+        finally:
+            await pipeline.close()
+
+    asyncio.run(asyncio.wait_for(main(), timeout=2))
+    assert apirone.transfers == [[{"address": "a", "amount": 200_000}, {"address": "b", "amount": 100_000}]]
+    assert sent == [(1, "tx1"), (2, "tx1"), (3, "tx1")]
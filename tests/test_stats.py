@@ -0,0 +1,15 @@
+import random
+
+from core.stats import TopK
+
+
+def test_top_k_matches_a_full_sort_under_increments():
+    rng = random.Random(7)
+    totals = {str(user_id): float(rng.randrange(100)) for user_id in range(50)}
+    top = TopK.build(5, totals)
+    for _ in range(2000):
+        user_id = str(rng.randrange(80))
+        totals[user_id] = totals.get(user_id, 0.0) + rng.randrange(1, 20)
+        top.update(user_id, totals[user_id])
+        expected = sorted(totals.values(), reverse=True)[:5]
+        assert [total for _, total in top.ranked()] == expected
@@ -0,0 +1,99 @@
+import asyncio
+import json
+
+import pytest
+
+from core.sequence import SequenceAllocator
+from core.storage import JsonStorage, SqliteStorage
+
+PENDING = {"key": "deposit:btc:tx2:a", "user_id": "1", "value": 0.001, "currency": "btc", "tx_hash": "tx2",
+           "input_address": "a", "received_at": 1700000000}
+
+
+def write_json_files(directory, pending):
+    files = {
+        "balances.json": {"seq": 3, "unit": "micros", "balances": {"1": 5_000_000}, "keys": ["deposit:btc:tx0:a"]},
+        "stats.json": {"wagered": {"1": 12.5}},
+        "pending_deposits.json": {record["key"]: record for record in pending},
+    }
+    for name, data in files.items():
+        (directory / name).write_text(json.dumps(data))
+    (directory / "ledger_keys.jsonl").write_text('"deposit:btc:tx1:a"\n')
+
+
+def open_sqlite(tmp_path):
+    async def main():
+        storage = SqliteStorage(str(tmp_path / "bot.db"), import_directory=str(tmp_path))
+        await storage.open()
+        try:
+            return (await storage.load_balances(), await storage.load_ledger_keys(), await storage.load_stats(),
+                    await storage.load_pending_deposits())
+        finally:
+            await storage.close()
+    return asyncio.run(main())
+
+
+def test_json_import_keeps_keys_stats_and_pending_deposits(tmp_path):
+    write_json_files(tmp_path, [PENDING])
+
+    balances, keys, stats, pending = open_sqlite(tmp_path)
+    assert balances == (3, {"1": 5_000_000})
+    assert keys == {"deposit:btc:tx0:a", "deposit:btc:tx1:a"}
+    assert stats == {"wagered": {"1": 12.5}}
+    assert pending == [PENDING]
+
+
+def test_failed_json_import_is_rolled_back_and_retried(tmp_path):
+    write_json_files(tmp_path, [{"key": "deposit:btc:tx2:a"}])  # Missing fields
+
+    with pytest.raises(KeyError):
+        open_sqlite(tmp_path)
+    assert not (tmp_path / "bot.db").exists()
+
+    write_json_files(tmp_path, [PENDING])
+    assert open_sqlite(tmp_path)[3] == [PENDING]
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_history_pages_by_keyset_cursor(tmp_path, backend):
+    async def main():
+        if backend == "json":
+            storage = JsonStorage(str(tmp_path))
+        else:
+            storage = SqliteStorage(str(tmp_path / "bot.db"), import_directory=None)
+        await storage.open()
+        try:
+            for amount in range(1, 6):
+                await storage.add_deposit("1", {"currency": "btc", "amount": float(amount), "timestamp": amount})
+                await storage.add_deposit("2", {"currency": "btc", "amount": 100.0 + amount, "timestamp": amount})
+
+            async def page(**cursor):
+                return await storage.get_history_page("deposits", "1", 2, **cursor)
+
+            newest = await page()
+            older = await page(before=newest[-1]["id"])
+            oldest = await page(before=older[-1]["id"])
+            past_end = await page(before=oldest[-1]["id"])
+            back = await page(after=oldest[0]["id"])
+            summary = await storage.get_history_summary("deposits", "1")
+            return [[record["amount"] for record in p] for p in (newest, older, oldest, past_end, back)], summary
+        finally:
+            await storage.close()
+
+    pages, summary = asyncio.run(main())
+    assert pages == [[5.0, 4.0], [3.0, 2.0], [1.0], [], [3.0, 2.0]]
+    assert summary == (5, 15.0)
+
+
+def test_sequence_ids_are_never_reused_across_restarts(tmp_path):
+    async def allocate(count):
+        storage = JsonStorage(str(tmp_path))
+        await storage.open()
+        try:
+            numbers = SequenceAllocator(storage, "coinflip", block_size=3)
+            return [await numbers.next() for _ in range(count)]
+        finally:
+            await storage.close()
+
+    assert asyncio.run(allocate(4)) == [1, 2, 3, 4]
+    assert asyncio.run(allocate(2)) == [7, 8]  # The rest of the reserved block is skipped